@@ -10,6 +10,8 @@ Created on 25 Jan 2022
 import math
 from enum import Enum
 
+import numpy as np
+
 from grid_search.cell_grid import Cell, CellGrid
 from grid_search.search_grid import SearchGridCell
 
@@ -69,6 +71,13 @@ class MapCell(Cell):
         MapCellType.ROBOT_END_STATION: True
     }
 
+    # The multiplier applied to the length of a step which enters a cell of
+    # this type. Types which are not listed have a multiplier of 1.
+    _traversability_cost = {
+        MapCellType.SECRET_DOOR: 5,
+        MapCellType.CUSTOMS_AREA: 100
+    }
+
     def __init__(self, coords, map_cell_type = MapCellType.OPEN_SPACE, params = None):
         
         Cell.__init__(self, coords)
@@ -98,6 +107,10 @@ class MapCell(Cell):
     def is_obstruction(self):
         return MapCell._is_obstruction.get(self._cell_type)
 
+    # The multiplier applied to the cost of entering this cell
+    def traversability_cost(self):
+        return MapCell._traversability_cost.get(self._cell_type, 1)
+
     # Other parameters
     def params(self):
         return self._params
@@ -142,29 +155,29 @@ class AirportMap(CellGrid):
         return self._map[x][y].is_obstruction()
     
     def set_wall(self, x, y):
-        self._map[x][y].set_cell_type(MapCellType.WALL)
+        self.set_cell_type(x, y, MapCellType.WALL)
         
     def set_open_space(self, x, y):
-        self._map[x][y].set_cell_type(MapCellType.OPEN_SPACE)
+        self.set_cell_type(x, y, MapCellType.OPEN_SPACE)
             
     def set_customs_area(self, x, y):
-        self._map[x][y].set_cell_type(MapCellType.CUSTOMS_AREA)
+        self.set_cell_type(x, y, MapCellType.CUSTOMS_AREA)
 
     def add_secret_door(self, x, y):#, door_cost):
         cell = self._map[x][y]
-        cell.set_cell_type(MapCellType.SECRET_DOOR)
+        self.set_cell_type(x, y, MapCellType.SECRET_DOOR)
         door_cost = 0
         cell.set_params((door_cost))
         
     def add_robot_end_station(self, x, y, terminal_action_reward = 0):
         cell = self._map[x][y]
-        cell.set_cell_type(MapCellType.ROBOT_END_STATION)
+        self.set_cell_type(x, y, MapCellType.ROBOT_END_STATION)
         cell.set_params((terminal_action_reward))        
 
     # Add a charging station
     def add_toilet(self, x, y):
         cell = self._map[x][y]
-        cell.set_cell_type(MapCellType.TOILET)
+        self.set_cell_type(x, y, MapCellType.TOILET)
         self._toilets.append(cell)
         
     def toilet(self, toilet_num):
@@ -176,7 +189,7 @@ class AirportMap(CellGrid):
     # Add a charging station
     def add_charging_station(self, x, y, mean, covariance):
         cell = self._map[x][y]
-        cell.set_cell_type(MapCellType.CHARGING_STATION)
+        self.set_cell_type(x, y, MapCellType.CHARGING_STATION)
         cell.set_params((mean, covariance))
         self._charging_stations.append(cell)
         
@@ -189,7 +202,7 @@ class AirportMap(CellGrid):
     # Add a charging station
     def add_rubbish_bin(self, x, y):
         cell = self._map[x][y]
-        cell.set_cell_type(MapCellType.RUBBISH_BIN)
+        self.set_cell_type(x, y, MapCellType.RUBBISH_BIN)
         self._rubbish_bins.append(cell)
         
     def rubbish_bin(self, rubbish_bin_num):
@@ -198,11 +211,36 @@ class AirportMap(CellGrid):
     def all_rubbish_bins(self):
         return self._rubbish_bins
     
+    # All edits to the cell types should go through here so that the
+    # map version is updated and cached arrays are rebuilt.
     def set_cell_type(self, x, y, cell_type):
         self._map[x][y].set_cell_type(cell_type)
+        self._increment_version()
         
     def set_use_cell_type_traversability_costs(self, use_cell_type_traversability_costs):
         self._use_cell_type_traversability_costs = use_cell_type_traversability_costs
+        self._increment_version()
+    
+    def obstruction_mask(self):
+        return self._cached_array('obstruction_mask', lambda : \
+            np.array([[self._map[x][y].is_obstruction() for y in range(self._height)] \
+                      for x in range(self._width)], dtype = bool))
+
+    # Array, indexed [x, y], of the MapCellType value of each cell
+    def cell_type_array(self):
+        return self._cached_array('cell_type', lambda : \
+            np.array([[self._map[x][y].cell_type().value for y in range(self._height)] \
+                      for x in range(self._width)], dtype = np.int8))
+
+    # If type-dependent costs are disabled, every cell has a multiplier of 1
+    def traversability_cost_array(self):
+        if self._use_cell_type_traversability_costs is False:
+            return self._cached_array('uniform_cost', lambda : \
+                np.ones((self._width, self._height)))
+        
+        return self._cached_array('traversability_cost', lambda : \
+            np.array([[self._map[x][y].traversability_cost() for y in range(self._height)] \
+                      for x in range(self._width)], dtype = float))
     
     def compute_transition_cost(self, last_coords, current_coords):
     
@@ -211,21 +249,15 @@ class AirportMap(CellGrid):
         L = math.sqrt(dX * dX + dY * dY)
         
         if self._use_cell_type_traversability_costs:
-            cell_type = self._map[current_coords[0]][current_coords[1]].cell_type()
-
-            alpha = 1
-
-            if cell_type == MapCellType.SECRET_DOOR:
-                alpha = 5
-            elif cell_type == MapCellType.CUSTOMS_AREA:
-                alpha = 100
+            alpha = self._map[current_coords[0]][current_coords[1]].traversability_cost()
 
             L *= alpha
             
         return L
         
-    def populate_search_grid(self, search_grid):
-        grid = [[SearchGridCell((x, y), self._map[x][y].is_obstruction()) for y in range(self._height)] \
+    def populate_search_grid(self, search_grid, robot_radius = 0):
+        blocked = self.inflated_obstruction_mask(robot_radius).tolist()
+        grid = [[SearchGridCell((x, y), blocked[x][y]) for y in range(self._height)] \
                      for x in range(self._width)]
         
         search_grid._set_search_grid(grid)
@@ -0,0 +1,149 @@
+# These classes publish the arrays which describe an airport map in shared
+# memory, so that worker processes can use the map without each one
+# receiving a pickled copy of every MapCell.
+#
+# The process which owns the map creates a SharedAirportMap. This copies
+# the cell type, traversability cost and obstruction arrays into
+# multiprocessing.shared_memory blocks. Its descriptor is a small,
+# picklable object which is sent to the workers. Each worker attaches to
+# the blocks with SharedAirportMapView, which stands in for the map and
+# exposes read-only NumPy views of the blocks without copying them.
+
+import math
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from grid_search.cell_grid import CellGrid
+from grid_search.search_grid import SearchGridCell
+
+from .airport_map import MapCell, MapCellType
+
+# The names of the arrays which are shared, and the methods of the map which
+# return them
+_SHARED_ARRAYS = ('cell_type_array', 'traversability_cost_array', 'obstruction_mask')
+
+# The information a worker needs to attach to a shared map
+class SharedAirportMapDescriptor(object):
+
+    def __init__(self, name, width, height, resolution, version, blocks):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.resolution = resolution
+        self.version = version
+
+        # Dictionary of array name -> (shared memory name, dtype string)
+        self.blocks = blocks
+
+class SharedAirportMap(object):
+
+    def __init__(self, airport_map):
+
+        self._shared_memory = []
+        blocks = {}
+
+        for array_name in _SHARED_ARRAYS:
+            array = getattr(airport_map, array_name)()
+            block = shared_memory.SharedMemory(create = True, size = max(1, array.nbytes))
+            np.ndarray(array.shape, dtype = array.dtype, buffer = block.buf)[...] = array
+            self._shared_memory.append(block)
+            blocks[array_name] = (block.name, array.dtype.str)
+
+        self._descriptor = SharedAirportMapDescriptor(airport_map.name(), airport_map.width(), \
+                                                      airport_map.height(), airport_map.resolution(), \
+                                                      airport_map.version(), blocks)
+
+    # The descriptor to send to the workers
+    def descriptor(self) -> SharedAirportMapDescriptor:
+        return self._descriptor
+
+    # Release the shared memory. The workers must have finished with it.
+    def close(self):
+        for block in self._shared_memory:
+            block.close()
+            block.unlink()
+        self._shared_memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# A read-only map built on top of the shared arrays. It supports everything
+# the planners need from an AirportMap. Cells are created on demand, and
+# the parameters of cells (such as the end station rewards) are not shared.
+class SharedAirportMapView(CellGrid):
+
+    def __init__(self, descriptor: SharedAirportMapDescriptor):
+        CellGrid.__init__(self, descriptor.name, descriptor.width, descriptor.height)
+
+        self._resolution = descriptor.resolution
+        self._version = descriptor.version
+
+        self._shared_memory = []
+        self._arrays = {}
+        for array_name, (block_name, dtype) in descriptor.blocks.items():
+            block = _attach_shared_memory(block_name)
+            array = np.ndarray((self._width, self._height), dtype = np.dtype(dtype), buffer = block.buf)
+            array.flags.writeable = False
+            self._shared_memory.append(block)
+            self._arrays[array_name] = array
+
+    # Attach to the shared map described by the descriptor
+    @classmethod
+    def attach(cls, descriptor: SharedAirportMapDescriptor):
+        return cls(descriptor)
+
+    def resolution(self):
+        return self._resolution
+
+    def cell(self, x, y):
+        return MapCell((x, y), MapCellType(int(self._arrays['cell_type_array'][x, y])))
+
+    def is_obstruction(self, x, y):
+        return bool(self._arrays['obstruction_mask'][x, y])
+
+    def cell_type_array(self):
+        return self._arrays['cell_type_array']
+
+    def traversability_cost_array(self):
+        return self._arrays['traversability_cost_array']
+
+    def obstruction_mask(self):
+        return self._arrays['obstruction_mask']
+
+    def compute_transition_cost(self, last_coords, current_coords):
+        dX = current_coords[0] - last_coords[0]
+        dY = current_coords[1] - last_coords[1]
+        return math.sqrt(dX * dX + dY * dY) * \
+            self._arrays['traversability_cost_array'][current_coords[0], current_coords[1]]
+
+    def populate_search_grid(self, search_grid, robot_radius = 0):
+        blocked = self.inflated_obstruction_mask(robot_radius).tolist()
+        grid = [[SearchGridCell((x, y), blocked[x][y]) for y in range(self._height)] \
+                     for x in range(self._width)]
+
+        search_grid._set_search_grid(grid)
+
+    # Detach from the shared memory. The views must not be used afterwards.
+    def close(self):
+        self._arrays = {}
+        self._array_cache = {}
+        self._clearance = None
+        for block in self._shared_memory:
+            block.close()
+        self._shared_memory = []
+
+# Attach to an existing block. Only the process which created the block
+# should unlink it. From Python 3.13 the block can be opened without
+# registering it with the resource tracker. Before that, the workers share
+# the creator's tracker, which keeps a set of names, so registering the block
+# again is harmless.
+def _attach_shared_memory(block_name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name = block_name, track = False)
+
+    return shared_memory.SharedMemory(name = block_name)
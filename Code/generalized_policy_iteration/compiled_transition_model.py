@@ -0,0 +1,298 @@
+# This class is a compiled form of the transition model p(s',r|s,a) of an
+# environment. Calling next_state_and_reward_distribution for every state,
+# action and sweep is very slow, so instead it is called once for each
+# state and action, and the results are stored in sparse arrays.
+#
+# The states are the cells which are not obstructed, numbered in x-major
+# order. state_index maps the (x, y) coordinates of a cell to its state
+# number, and is -1 for obstructed cells. The terminal states have no
+# transitions; their value is fixed to the terminal reward.
+#
+# The transitions are stored as a CSR matrix with a row for each state and
+# action. Row s * number_of_actions + a holds p(s'|s,a), and the expected
+# reward for the row is sum over s' and r of p(s',r|s,a) * r. The Q values
+# for all the states and actions are then
+#
+#     q = (expected_rewards + gamma * transitions @ v).reshape(n, A)
+#
+# The model also keeps the best reward for moving from each state to each
+# of its successors. This gives the deterministic values: the values if
+# the robot could choose the outcome of every action. They are an upper
+# bound on the optimal values, and equal to them if the transitions are
+# deterministic.
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+
+class CompiledTransitionModel(object):
+
+    def __init__(self, environment):
+        environment_map = environment.map()
+        width = environment_map.width()
+        height = environment_map.height()
+
+        self._number_of_actions = environment.available_actions().n
+
+        # Number the states
+        self._state_index = np.full((width, height), -1, dtype = np.int64)
+        state_coords = []
+        for x in range(width):
+            for y in range(height):
+                if environment_map.cell(x, y).is_obstruction() is False:
+                    self._state_index[x, y] = len(state_coords)
+                    state_coords.append((x, y))
+
+        self._state_coords = np.array(state_coords, dtype = np.int64).reshape(-1, 2)
+        number_of_states = len(state_coords)
+
+        self._is_terminal = np.zeros(number_of_states, dtype = bool)
+        self._terminal_values = np.zeros(number_of_states)
+
+        # Build the transitions. Outcomes with zero probability are dropped,
+        # and outcomes which lead to the same state are summed when the
+        # matrix is converted to CSR.
+        rows = []
+        columns = []
+        probabilities = []
+        rewards = []
+        self._expected_rewards = np.zeros(number_of_states * self._number_of_actions)
+
+        for s, (x, y) in enumerate(state_coords):
+            cell = environment_map.cell(x, y)
+            if cell.is_terminal():
+                self._is_terminal[s] = True
+                self._terminal_values[s] = cell.params()
+                continue
+
+            for a in range(self._number_of_actions):
+                row = s * self._number_of_actions + a
+                s_prime, r, p = environment.next_state_and_reward_distribution((x, y), a)
+                expected_reward = 0
+                for t in range(len(p)):
+                    if p[t] == 0:
+                        continue
+                    s_prime_coords = s_prime[t].coords()
+                    rows.append(row)
+                    columns.append(self._state_index[s_prime_coords[0], s_prime_coords[1]])
+                    probabilities.append(p[t])
+                    rewards.append(r[t])
+                    expected_reward += p[t] * r[t]
+                self._expected_rewards[row] = expected_reward
+
+        self._transitions = sparse.csr_matrix((probabilities, (rows, columns)), \
+                                              shape = (number_of_states * self._number_of_actions, \
+                                                       number_of_states))
+        self._transitions.sum_duplicates()
+
+        # The best reward for each pair of states. The pairs are sorted, so
+        # the maximum of each run of equal pairs can be taken.
+        sources = np.array(rows, dtype = np.int64) // self._number_of_actions
+        destinations = np.array(columns, dtype = np.int64)
+        rewards = np.array(rewards, dtype = float)
+        order = np.lexsort((destinations, sources))
+        pairs = sources[order] * number_of_states + destinations[order]
+        starts = np.flatnonzero(np.diff(pairs, prepend = -1))
+        best_rewards = np.maximum.reduceat(rewards[order], starts) if len(starts) > 0 else rewards
+        self._best_rewards = sparse.csr_matrix((best_rewards, (sources[order][starts], destinations[order][starts])), \
+                                               shape = (number_of_states, number_of_states))
+
+        # Derived structures, built when they are first needed
+        self._row_outcomes = None
+        self._state_graph = None
+        self._distances_to_terminals = None
+        self._components = None
+        self._deterministic_values = {}
+
+    def number_of_states(self):
+        return len(self._state_coords)
+
+    def number_of_actions(self):
+        return self._number_of_actions
+
+    # Array of the (x, y) coordinates of each state
+    def state_coords(self):
+        return self._state_coords
+
+    # Array of the state number of each cell, -1 for obstructions
+    def state_index(self):
+        return self._state_index
+
+    def is_terminal(self):
+        return self._is_terminal
+
+    # The value of each terminal state, and 0 for the other states
+    def terminal_values(self):
+        return self._terminal_values
+
+    # The sparse matrix of p(s'|s,a), with a row for each state and action
+    def transitions(self):
+        return self._transitions
+
+    def expected_rewards(self):
+        return self._expected_rewards
+
+    # Does every action lead to a single next state?
+    def is_deterministic(self):
+        return bool(np.all(np.diff(self._transitions.indptr) <= 1))
+
+    # The transitions as a list, with an entry (expected reward, next states,
+    # probabilities) for each row. Plain lists are much faster than sparse
+    # arrays for backing up one state at a time.
+    def row_outcomes(self):
+        if self._row_outcomes is None:
+            indptr = self._transitions.indptr.tolist()
+            indices = self._transitions.indices.tolist()
+            data = self._transitions.data.tolist()
+            expected_rewards = self._expected_rewards.tolist()
+            self._row_outcomes = [(expected_rewards[row], indices[indptr[row]:indptr[row + 1]], \
+                                   data[indptr[row]:indptr[row + 1]]) for row in range(len(expected_rewards))]
+        return self._row_outcomes
+
+    # The (number_of_states, number_of_states) sparse matrix which is
+    # nonzero where some action can lead from one state to the other
+    def state_graph(self):
+        if self._state_graph is None:
+            transitions = self._transitions.tocoo()
+            number_of_states = self.number_of_states()
+            self._state_graph = sparse.csr_matrix((np.ones(transitions.nnz), \
+                                                   (transitions.row // self._number_of_actions, transitions.col)), \
+                                                  shape = (number_of_states, number_of_states))
+            self._state_graph.sum_duplicates()
+            self._state_graph.data[:] = 1
+        return self._state_graph
+
+    # The smallest number of steps from each state to a terminal state.
+    # This is inf for states which can't reach one.
+    def distances_to_terminals(self):
+        if self._distances_to_terminals is None:
+            terminals = np.flatnonzero(self._is_terminal)
+            if len(terminals) == 0:
+                self._distances_to_terminals = np.full(self.number_of_states(), np.inf)
+            else:
+                self._distances_to_terminals = csgraph.dijkstra(self.state_graph().T.tocsr(), \
+                                                                indices = terminals, min_only = True, \
+                                                                unweighted = True)
+        return self._distances_to_terminals
+
+    # The strongly connected components of the state graph, as arrays of
+    # state numbers, in reverse topological order: no state can lead to a
+    # state in an earlier component. If actions is given, the graph only
+    # has the transitions of the action actions[s] in each state s.
+    def reverse_topological_components(self, actions = None):
+        if actions is not None:
+            return self._reverse_topological_components(self.policy_transitions(actions)[0])
+        if self._components is None:
+            self._components = self._reverse_topological_components(self.state_graph())
+        return self._components
+
+    def _reverse_topological_components(self, graph):
+        number_of_components, labels = csgraph.connected_components(graph, directed = True, \
+                                                                    connection = 'strong')
+
+        # The edges between the components
+        graph = graph.tocoo()
+        sources = labels[graph.row]
+        destinations = labels[graph.col]
+        between = sources != destinations
+        edges = np.unique(np.stack((sources[between], destinations[between]), axis = 1), axis = 0)
+
+        # Kahn's algorithm, run backwards from the components with no
+        # successors
+        number_of_successors = np.bincount(edges[:, 0], minlength = number_of_components).tolist()
+        predecessors = [[] for _ in range(number_of_components)]
+        for source, destination in edges.tolist():
+            predecessors[destination].append(source)
+
+        order = [c for c in range(number_of_components) if number_of_successors[c] == 0]
+        for c in order:
+            for predecessor in predecessors[c]:
+                number_of_successors[predecessor] -= 1
+                if number_of_successors[predecessor] == 0:
+                    order.append(predecessor)
+
+        states_by_label = np.argsort(labels, kind = 'stable')
+        members = np.split(states_by_label, np.cumsum(np.bincount(labels, minlength = number_of_components))[:-1])
+
+        return [members[c] for c in order]
+
+    # The (number_of_states, number_of_states) sparse matrix of the best
+    # reward for moving from one state to another, over all the actions
+    # and outcomes. Rewards of zero are stored explicitly.
+    def best_rewards(self):
+        return self._best_rewards
+
+    # The value of each state if the robot could choose the outcome of each
+    # action. If gamma is 1, this is found with Dijkstra's algorithm from
+    # the terminal states, and is -inf for states which can't reach one.
+    # This needs all the rewards to be zero or less. Otherwise, the values
+    # are iterated down from an upper bound until they change by less than
+    # theta, so they never fall below the true values.
+    def deterministic_values(self, gamma, theta = 1e-10):
+        key = (gamma, theta)
+        if key not in self._deterministic_values:
+            if gamma == 1:
+                values = self._deterministic_values_by_dijkstra()
+            else:
+                values = self._deterministic_values_by_iteration(gamma, theta)
+            self._deterministic_values[key] = values
+        return self._deterministic_values[key]
+
+    def _deterministic_values_by_dijkstra(self):
+        number_of_states = self.number_of_states()
+        terminals = np.flatnonzero(self._is_terminal)
+        if len(terminals) == 0:
+            return np.full(number_of_states, -np.inf)
+
+        rewards = self._best_rewards.tocoo()
+        if np.any(rewards.data > 0):
+            raise ValueError('Dijkstra\'s algorithm needs all the rewards to be zero or less')
+
+        # Search backwards from an extra node, which is joined to each
+        # terminal with a cost of how much less its value is than the best
+        # terminal value
+        best_terminal_value = np.max(self._terminal_values[terminals])
+        graph = sparse.csr_matrix((np.concatenate((-rewards.data, best_terminal_value - self._terminal_values[terminals])), \
+                                   (np.concatenate((rewards.col, np.full(len(terminals), number_of_states))), \
+                                    np.concatenate((rewards.row, terminals)))), \
+                                  shape = (number_of_states + 1, number_of_states + 1))
+
+        distances = csgraph.dijkstra(graph, indices = number_of_states)
+        return best_terminal_value - distances[:number_of_states]
+
+    def _deterministic_values_by_iteration(self, gamma, theta):
+        non_terminal = ~self._is_terminal
+        values = self._terminal_values.copy()
+        rows = np.flatnonzero(non_terminal)
+        if len(rows) == 0:
+            return values
+
+        # The values can't be more than this
+        best_reward = np.max(self._best_rewards.data)
+        upper_bound = max(np.max(self._terminal_values[self._is_terminal], initial = -np.inf), \
+                          best_reward / (1 - gamma))
+        values[non_terminal] = upper_bound
+
+        # Every non-terminal state has at least one successor
+        indptr = self._best_rewards.indptr
+        indices = self._best_rewards.indices
+        data = self._best_rewards.data
+        while True:
+            new_values = np.maximum.reduceat(data + gamma * values[indices], indptr[rows])
+            delta = np.max(np.abs(new_values - values[rows]))
+            values[rows] = new_values
+            if delta < theta:
+                return values
+
+    # Get the transitions and expected rewards when each state s takes the
+    # action actions[s]. The transitions are a (number_of_states,
+    # number_of_states) sparse matrix.
+    def policy_transitions(self, actions):
+        rows = np.arange(len(actions)) * self._number_of_actions + actions
+        return self._transitions[rows], self._expected_rewards[rows]
+
+    # Compute the (number_of_states, number_of_actions) array of Q values
+    def q_values(self, values, gamma):
+        q = self._expected_rewards + gamma * (self._transitions @ values)
+        return q.reshape(-1, self._number_of_actions)
@@ -0,0 +1,63 @@
+# This class is a plain old data structure (=no hidden fields)
+# which stores how a dynamic programming solver converged
+
+class ConvergenceStats(object):
+
+    def __init__(self, backup_scheme = None):
+
+        # The backup scheme used. This is None if the solver looped over
+        # the cells of the environment.
+        self.backup_scheme = backup_scheme
+
+        # The number of sweeps, and the total number of state backups
+        self.number_of_sweeps = 0
+        self.number_of_backups = 0
+
+        # The number of policy evaluations solved as a linear system, each of
+        # which is recorded as one sweep whose delta is the residual, and the
+        # number of sweeps made evaluating iteratively because the system was
+        # singular
+        self.number_of_linear_solves = 0
+        self.number_of_fallback_sweeps = 0
+
+        # The number of trials, for solvers which run trials from a set of
+        # start states rather than sweeping, and the number of different
+        # states they backed up. None for the other solvers.
+        self.number_of_trials = None
+        self.number_of_states_backed_up = None
+
+        # The largest change in the value function in each sweep, or in
+        # each trial
+        self.deltas = []
+
+        # Did the last sweep change the value function by less than theta?
+        self.converged = False
+
+        # True if the transitions were deterministic, and the solver found
+        # the values with a shortest path search rather than by sweeping
+        self.deterministic = False
+
+        # True if the values started from the shortest path values. If the
+        # savings were measured, the number of sweeps and backups fewer
+        # than starting from the initial value function, otherwise None.
+        self.warm_start = False
+        self.sweeps_saved = None
+        self.backups_saved = None
+
+        # The time taken by the solver
+        self.time_in_seconds = 0
+
+    # The largest change in the last sweep
+    def final_delta(self):
+        return self.deltas[-1] if len(self.deltas) > 0 else None
+
+    def __repr__(self):
+        scheme = None if self.backup_scheme is None else self.backup_scheme.name
+        return f'ConvergenceStats(backup_scheme={scheme}, sweeps={self.number_of_sweeps}, ' \
+            f'backups={self.number_of_backups}, linear_solves={self.number_of_linear_solves}, ' \
+            f'fallback_sweeps={self.number_of_fallback_sweeps}, trials={self.number_of_trials}, ' \
+            f'states_backed_up={self.number_of_states_backed_up}, final_delta={self.final_delta()}, ' \
+            f'converged={self.converged}, deterministic={self.deterministic}, ' \
+            f'warm_start={self.warm_start}, sweeps_saved={self.sweeps_saved}, ' \
+            f'backups_saved={self.backups_saved}, ' \
+            f'time={self.time_in_seconds:.6f}s)'
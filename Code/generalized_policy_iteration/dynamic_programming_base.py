@@ -6,14 +6,52 @@ Created on 31 Jan 2022
 
 # This is the base class for policy and value iteration
 
+import copy
+import time
+import warnings
+from enum import Enum
 from typing import Optional
 
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import MatrixRankWarning, spsolve
+
+from grid_search.hooks import HookRegistry
+
+from .convergence_stats import ConvergenceStats
 from .environment_base import EnvironmentBase
 from .tabular_policy import TabularPolicy
 from .tabular_value_function import TabularValueFunction
 from .value_function_drawer import ValueFunctionDrawer
 
 
+# How a policy is evaluated. ITERATIVE sweeps until the value function
+# changes by less than theta. LINEAR_SOLVE solves the linear system which
+# the value function of the policy satisfies directly. If the system is
+# singular - for example, if the policy never reaches a terminal state and
+# gamma is 1 - it falls back to the iterative method.
+
+class PolicyEvaluationMode(Enum):
+    ITERATIVE = 0
+    LINEAR_SOLVE = 1
+
+# How the vectorised engine sweeps over the states. JACOBI updates all the
+# states at once from the values of the previous sweep. The others update
+# the values in place, one state at a time: GAUSS_SEIDEL in x-then-y order,
+# ORDERED starting with the states closest to a terminal state, and
+# ALTERNATING in x-then-y and y-then-x order, forwards and backwards, in
+# turn. TOPOLOGICAL splits the state graph into strongly connected
+# components and solves them one at a time, each to convergence, starting
+# with the components closest to the terminal states. A component is never
+# swept again once it has converged.
+
+class BackupScheme(Enum):
+    GAUSS_SEIDEL = 0
+    JACOBI = 1
+    ORDERED = 2
+    ALTERNATING = 3
+    TOPOLOGICAL = 4
+
 class DynamicProgrammingBase(object):
 
     def __init__(self, environment: EnvironmentBase):
@@ -40,6 +78,41 @@ class DynamicProgrammingBase(object):
         # Shows debug output interactively
         self._policy_drawer = None
         self._value_drawer = None
+
+        # Callbacks for instrumenting the solvers. on_sweep(solver, delta) is
+        # called after each sweep over the states, with the largest change
+        # in the value function. on_policy_update(solver) is called after
+        # each time the policy is improved or extracted.
+        self._hooks = HookRegistry(('on_sweep', 'on_policy_update'))
+
+        # If true, the backups are computed with NumPy over the environment's
+        # compiled transition model, rather than by looping over the cells.
+        # All the states are updated at once from the values of the previous
+        # sweep, so the number of sweeps can differ slightly.
+        self._use_vectorised_engine = False
+
+        # If true, print progress information
+        self._verbose = False
+
+        # How policies are evaluated
+        self._policy_evaluation_mode = PolicyEvaluationMode.ITERATIVE
+
+        # How the vectorised engine sweeps over the states
+        self._backup_scheme = BackupScheme.JACOBI
+
+        # If true, and the environment's compiled transition model is
+        # deterministic, the optimal values are found with a shortest path
+        # search rather than by sweeping
+        self._use_deterministic_fast_path = True
+
+        # If true, the values start from the shortest path values rather
+        # than the environment's initial value function
+        self._warm_start = False
+        self._measure_sweeps_saved = False
+        self._warm_start_pending = False
+
+        # How the last call to solve_policy or evaluate converged
+        self._convergence_stats = None
         
     # Set the drawer which will show the policy.
     # If set, this will update interactively.
@@ -51,6 +124,67 @@ class DynamicProgrammingBase(object):
     def set_value_function_drawer(self, value_drawer: ValueFunctionDrawer):
         self._value_drawer = value_drawer
 
+    # Subscribe a callback to one of the events, on_sweep or on_policy_update
+    def add_hook(self, event: str, callback):
+        return self._hooks.add_hook(event, callback)
+
+    def remove_hook(self, event: str, callback):
+        self._hooks.remove_hook(event, callback)
+
+    # Use the vectorised engine. The environment must provide
+    # compiled_transition_model().
+    def set_use_vectorised_engine(self, use_vectorised_engine):
+        self._use_vectorised_engine = use_vectorised_engine
+
+    def use_vectorised_engine(self):
+        return self._use_vectorised_engine
+
+    # Set how policies are evaluated. LINEAR_SOLVE uses the environment's
+    # compiled transition model, even if the vectorised engine is not used.
+    def set_policy_evaluation_mode(self, policy_evaluation_mode: PolicyEvaluationMode):
+        self._policy_evaluation_mode = policy_evaluation_mode
+
+    def policy_evaluation_mode(self):
+        return self._policy_evaluation_mode
+
+    # Set how the vectorised engine sweeps over the states. The loops over
+    # the cells of the environment are always Gauss-Seidel.
+    def set_backup_scheme(self, backup_scheme: BackupScheme):
+        self._backup_scheme = backup_scheme
+
+    def backup_scheme(self):
+        return self._backup_scheme
+
+    # Use the shortest path search when the transitions are deterministic
+    def set_use_deterministic_fast_path(self, use_deterministic_fast_path):
+        self._use_deterministic_fast_path = use_deterministic_fast_path
+
+    def use_deterministic_fast_path(self):
+        return self._use_deterministic_fast_path
+
+    # Start the values from the deterministic values of the environment's
+    # compiled transition model - the negated cost to go along the shortest
+    # paths to the terminal states - rather than from the environment's
+    # initial value function. This takes effect from the next call to
+    # initialize without an initial value function. The values are set
+    # when solving starts, so gamma can be changed after initialize. If
+    # measure_sweeps_saved is true, solve_policy solves again from the
+    # initial value function to find how many sweeps were saved.
+    def set_warm_start(self, warm_start, measure_sweeps_saved = False):
+        self._warm_start = warm_start
+        self._measure_sweeps_saved = measure_sweeps_saved
+
+    def warm_start(self):
+        return self._warm_start
+
+    # Get the ConvergenceStats of the last solve
+    def convergence_stats(self) -> Optional[ConvergenceStats]:
+        return self._convergence_stats
+
+    # Print progress information, such as each policy evaluation sweep
+    def set_verbose(self, verbose):
+        self._verbose = verbose
+
     # Set the discount factor        
     def set_gamma(self, gamma):
         self._gamma = gamma
@@ -77,6 +211,8 @@ class DynamicProgrammingBase(object):
             self._v = self._environment.initial_value_function()
         else:
             self._v = initial_v
+
+        self._warm_start_pending = (initial_v is None) and (self._warm_start is True)
             
         if initial_pi is None:
             self._pi = self._environment.initial_policy()
@@ -101,6 +237,414 @@ class DynamicProgrammingBase(object):
     def policy(self):
         return self._pi
     
+    # Get the value of each state of the compiled model from the value function
+    def _state_values(self, model):
+        state_coords = model.state_coords()
+        return self._v.value_array()[state_coords[:, 0], state_coords[:, 1]].astype(float)
+
+    # Store the values of the non-terminal states in the value function
+    def _store_state_values(self, model, values):
+        non_terminal = ~model.is_terminal()
+        state_coords = model.state_coords()[non_terminal]
+        self._v.value_array()[state_coords[:, 0], state_coords[:, 1]] = values[non_terminal]
+
+    # Get the action of each state from the policy
+    def _state_actions(self, model):
+        return np.array([int(self._pi.action(x, y)) for x, y in model.state_coords().tolist()], \
+                        dtype = np.int64)
+
+    # Store the actions of the non-terminal states in the policy
+    def _store_state_actions(self, model, actions):
+        is_terminal = model.is_terminal()
+        for s, (x, y) in enumerate(model.state_coords().tolist()):
+            if is_terminal[s] == False:
+                self._pi.set_action(x, y, int(actions[s]))
+
+    # Compute the Q values of the non-terminal states for the current
+    # values, and the greedy action in each state. Ties go to the lowest
+    # numbered action, as in the loops.
+    def _greedy_backup(self, model, values):
+        q = model.q_values(values, self._gamma)
+        actions = np.argmax(q, axis = 1)
+        return q[np.arange(len(actions)), actions], actions
+
+    # Evaluate the current policy over the compiled transition model. Each
+    # sweep updates all the non-terminal states at once. Stops when the
+    # largest change is less than theta, returning True, or after
+    # max_steps sweeps, returning False.
+    def _evaluate_policy_vectorised(self, max_steps):
+
+        model = self._environment.compiled_transition_model()
+        non_terminal = ~model.is_terminal()
+        transitions, expected_rewards = model.policy_transitions(self._state_actions(model))
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
+        values = self._state_values(model)
+        converged = False
+
+        if self._backup_scheme == BackupScheme.TOPOLOGICAL:
+            converged = self._solve_topologically(model, values, max_steps, self._state_actions(model))
+            if (converged is False) and (self._verbose is True):
+                print('Maximum number of iterations exceeded')
+            self._store_state_values(model, values)
+            return converged
+
+        if self._backup_scheme != BackupScheme.JACOBI:
+            actions = self._state_actions(model)
+            orders = self._sweep_orders(model)
+
+        for iteration in range(1, max_steps + 1):
+            if self._backup_scheme == BackupScheme.JACOBI:
+                new_values = np.where(non_terminal, expected_rewards + self._gamma * (transitions @ values), values)
+                delta = np.max(np.abs(new_values - values), initial = 0)
+                values = new_values
+                self._record_sweep(delta, np.count_nonzero(non_terminal))
+            else:
+                order = orders[(iteration - 1) % len(orders)]
+                delta = self._sweep_in_place(model, values, order, actions)
+                self._record_sweep(delta, len(order))
+
+            if on_sweep is not None:
+                on_sweep(self, delta)
+
+            if self._verbose is True:
+                print(f'Finished policy evaluation iteration {iteration}')
+
+            if delta < self._theta:
+                converged = True
+                break
+
+        if (converged is False) and (self._verbose is True):
+            print('Maximum number of iterations exceeded')
+
+        self._store_state_values(model, values)
+
+        return converged
+
+    # Evaluate the current policy by solving
+    #
+    #     (I - gamma * P_nn) v_n = r_n + gamma * P_nt v_t
+    #
+    # where n are the non-terminal states and t the terminal states, whose
+    # values are fixed. Returns True if the solve succeeded. Otherwise, the
+    # policy is evaluated iteratively for up to max_steps sweeps, which are
+    # also counted as fallback sweeps in the convergence statistics.
+    def _evaluate_policy_linear_solve(self, max_steps):
+
+        model = self._environment.compiled_transition_model()
+        non_terminal = ~model.is_terminal()
+        transitions, expected_rewards = model.policy_transitions(self._state_actions(model))
+
+        values = self._state_values(model)
+
+        transitions_to_non_terminal = transitions[non_terminal][:, non_terminal]
+        transitions_to_terminal = transitions[non_terminal][:, ~non_terminal]
+
+        a = sparse.identity(transitions_to_non_terminal.shape[0], format = 'csc') - \
+            self._gamma * transitions_to_non_terminal.tocsc()
+        b = expected_rewards[non_terminal] + self._gamma * (transitions_to_terminal @ values[~non_terminal])
+
+        # A singular matrix is reported by a warning, and sometimes just by
+        # values which are not finite or do not satisfy the system
+        solution = None
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', MatrixRankWarning)
+            try:
+                solution = np.atleast_1d(spsolve(a, b))
+            except (MatrixRankWarning, RuntimeError):
+                pass
+
+        residual = None
+        if (solution is not None) and np.all(np.isfinite(solution)):
+            residual = float(np.max(np.abs(a @ solution - b), initial = 0))
+
+        stats = self._convergence_stats
+        if (residual is None) or (residual > self._theta):
+            if self._verbose is True:
+                print('The policy evaluation system is singular; evaluating iteratively')
+            sweeps_before = stats.number_of_sweeps
+            converged = self._evaluate_policy_vectorised(max_steps)
+            stats.number_of_fallback_sweeps += stats.number_of_sweeps - sweeps_before
+            return converged
+
+        # The solve is recorded as one sweep whose delta is the residual
+        values[non_terminal] = solution
+        self._store_state_values(model, values)
+        stats.number_of_linear_solves += 1
+        self._record_sweep(residual, np.count_nonzero(non_terminal))
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+        if on_sweep is not None:
+            on_sweep(self, residual)
+
+        if self._verbose is True:
+            print('Solved the policy evaluation system')
+
+        return True
+
+    # The orders in which the in-place backup schemes visit the
+    # non-terminal states. Sweep i uses order i modulo the number of orders.
+    def _sweep_orders(self, model):
+        non_terminal = np.flatnonzero(~model.is_terminal())
+
+        if self._backup_scheme == BackupScheme.ORDERED:
+            distances = model.distances_to_terminals()[non_terminal]
+            return [non_terminal[np.argsort(distances, kind = 'stable')]]
+
+        if self._backup_scheme == BackupScheme.ALTERNATING:
+            state_coords = model.state_coords()[non_terminal]
+            y_major = non_terminal[np.lexsort((state_coords[:, 0], state_coords[:, 1]))]
+            return [non_terminal, y_major, non_terminal[::-1], y_major[::-1]]
+
+        return [non_terminal]
+
+    # Back up the states in the order given, updating the values in place.
+    # If actions is None, the values are maximised over the actions;
+    # otherwise each state s uses actions[s]. Returns the largest change.
+    def _sweep_in_place(self, model, values, order, actions = None):
+        v = values.tolist()
+        delta = self._sweep_list_in_place(model, v, order, actions)
+        values[:] = v
+        return delta
+
+    # The same as _sweep_in_place, but the values are a list
+    def _sweep_list_in_place(self, model, v, order, actions = None):
+        row_outcomes = model.row_outcomes()
+        number_of_actions = model.number_of_actions()
+        gamma = self._gamma
+        delta = 0
+
+        for s in order.tolist():
+            if actions is None:
+                new_v = -float('inf')
+                for row in range(s * number_of_actions, (s + 1) * number_of_actions):
+                    expected_reward, next_states, probabilities = row_outcomes[row]
+                    q = expected_reward
+                    for s_prime, p in zip(next_states, probabilities):
+                        q += gamma * p * v[s_prime]
+                    if q > new_v:
+                        new_v = q
+            else:
+                expected_reward, next_states, probabilities = row_outcomes[s * number_of_actions + actions[s]]
+                new_v = expected_reward
+                for s_prime, p in zip(next_states, probabilities):
+                    new_v += gamma * p * v[s_prime]
+
+            change = abs(new_v - v[s])
+            if change > delta:
+                delta = change
+            v[s] = new_v
+
+        return delta
+
+    # Solve for the values one strongly connected component of the state
+    # graph at a time, in reverse topological order. The states of each
+    # component are swept in place, closest to a terminal state first,
+    # until the largest change is less than theta or after max_sweeps
+    # sweeps. If actions is None, the values are maximised over the
+    # actions; otherwise each state s uses actions[s]. Every
+    # number_of_states backups are recorded as one sweep. Returns True if
+    # all the components converged.
+    def _solve_topologically(self, model, values, max_sweeps, actions = None):
+
+        non_terminal = ~model.is_terminal()
+        number_of_non_terminal_states = np.count_nonzero(non_terminal)
+        distances = model.distances_to_terminals()
+        components = model.reverse_topological_components(actions)
+        graph = model.state_graph() if actions is None else model.policy_transitions(actions)[0]
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
+        v = values.tolist()
+        converged = True
+        backups = 0
+        sweep_backups = 0
+        sweep_delta = 0
+
+        for component in components:
+            component = component[non_terminal[component]]
+            if len(component) == 0:
+                continue
+            order = component[np.argsort(distances[component], kind = 'stable')]
+
+            # The successors of a single state which can't lead back to
+            # itself have all been solved, so one backup is enough
+            solved_by_one_backup = (len(order) == 1) and (graph[order[0], order[0]] == 0)
+
+            for sweep in range(max_sweeps):
+                delta = self._sweep_list_in_place(model, v, order, actions)
+                backups += len(order)
+                sweep_backups += len(order)
+                sweep_delta = max(sweep_delta, delta)
+
+                if sweep_backups >= number_of_non_terminal_states:
+                    self._record_sweep(sweep_delta, sweep_backups)
+                    if on_sweep is not None:
+                        on_sweep(self, sweep_delta)
+                    sweep_backups = 0
+                    sweep_delta = 0
+
+                if (solved_by_one_backup is True) or (delta < self._theta):
+                    break
+            else:
+                converged = False
+
+        # Record the last, partial sweep
+        if (sweep_backups > 0) or (backups == 0):
+            self._record_sweep(sweep_delta, sweep_backups)
+            if on_sweep is not None:
+                on_sweep(self, sweep_delta)
+        self._convergence_stats.converged = converged
+
+        values[:] = v
+        return converged
+
+    # If the environment's compiled transition model is deterministic, the
+    # optimal values are its deterministic values, found with Dijkstra's
+    # algorithm if gamma is 1. They are checked by backing up every state
+    # once, and if the largest change is less than theta the values and
+    # the greedy policy are stored. Returns False, leaving the value
+    # function and policy alone, if the values can't be found this way -
+    # for example, if some states can't reach a terminal state.
+    def _solve_deterministically(self):
+
+        if self._use_deterministic_fast_path is False:
+            return False
+
+        # Environments which can't be compiled always sweep
+        compiled_transition_model = getattr(self._environment, 'compiled_transition_model', None)
+        if compiled_transition_model is None:
+            return False
+
+        model = compiled_transition_model()
+        if model.is_deterministic() is False:
+            return False
+
+        try:
+            values = model.deterministic_values(self._gamma).copy()
+        except ValueError:
+            return False
+
+        non_terminal = ~model.is_terminal()
+        values[~non_terminal] = model.terminal_values()[~non_terminal]
+        if np.all(np.isfinite(values)) == False:
+            if self._verbose is True:
+                print('Some states cannot reach a terminal state; sweeping instead')
+            return False
+
+        # The search adds the rewards up in a different order from the
+        # backups, so the values can differ in the last few bits, which can
+        # change how ties between actions are broken. Backing the states up
+        # once in place, best first, recomputes each value from its
+        # successor on the shortest path, so they are the same as sweeping
+        # would give.
+        order = np.flatnonzero(non_terminal)
+        order = order[np.argsort(-values[order], kind = 'stable')]
+        self._sweep_in_place(model, values, order)
+
+        best_q, actions = self._greedy_backup(model, values)
+        residual = np.max(np.abs(best_q - values)[non_terminal], initial = 0)
+
+        if residual >= self._theta:
+            if self._verbose is True:
+                print(f'The shortest path values have a residual of {residual}; sweeping instead')
+            return False
+
+        self._store_state_values(model, values)
+        self._store_state_actions(model, actions)
+
+        self._record_sweep(residual, 2 * len(order))
+        self._convergence_stats.deterministic = True
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+        if on_sweep is not None:
+            on_sweep(self, residual)
+
+        if self._verbose is True:
+            print('Solved the deterministic transitions with a shortest path search')
+
+        return True
+
+    # If a warm start is pending, set the values of the non-terminal states
+    # which can reach a terminal state to their deterministic values. Must
+    # be called after the convergence statistics have started. If the
+    # sweeps saved are to be measured, returns a copy of the policy to
+    # start the comparison from; otherwise returns None.
+    def _apply_warm_start(self):
+
+        if self._warm_start_pending is False:
+            return None
+        self._warm_start_pending = False
+
+        # Environments which can't be compiled always start cold
+        compiled_transition_model = getattr(self._environment, 'compiled_transition_model', None)
+        if compiled_transition_model is None:
+            return None
+
+        model = compiled_transition_model()
+        try:
+            deterministic_values = model.deterministic_values(self._gamma)
+        except ValueError:
+            return None
+
+        values = self._state_values(model)
+        warm = ~model.is_terminal() & np.isfinite(deterministic_values)
+        values[warm] = deterministic_values[warm]
+        self._store_state_values(model, values)
+
+        self._convergence_stats.warm_start = True
+
+        if self._verbose is True:
+            print('Started from the shortest path values')
+
+        if self._measure_sweeps_saved is True:
+            return copy.deepcopy(self._pi)
+        return None
+
+    # Solve again with a copy of this solver, starting from the initial
+    # value function and the policy given, and record how many sweeps and
+    # backups the warm start saved. The copy has no drawers or hooks. solve
+    # runs the copy; by default it calls solve_policy.
+    def _record_sweeps_saved(self, initial_pi, solve = None):
+        cold_solver = copy.copy(self)
+        cold_solver._policy_drawer = None
+        cold_solver._value_drawer = None
+        cold_solver._hooks = HookRegistry(self._hooks.events())
+        cold_solver._warm_start = False
+        cold_solver.initialize(initial_pi = initial_pi)
+        if solve is None:
+            cold_solver.solve_policy()
+        else:
+            solve(cold_solver)
+
+        cold_stats = cold_solver.convergence_stats()
+        stats = self._convergence_stats
+        stats.sweeps_saved = cold_stats.number_of_sweeps - stats.number_of_sweeps
+        stats.backups_saved = cold_stats.number_of_backups - stats.number_of_backups
+
+    # Start collecting the convergence statistics
+    def _begin_convergence_stats(self, backup_scheme):
+        self._convergence_stats = ConvergenceStats(backup_scheme)
+        self._convergence_start_time = time.perf_counter()
+
+    def _record_sweep(self, delta, number_of_backups):
+        stats = self._convergence_stats
+        stats.number_of_sweeps += 1
+        stats.number_of_backups += int(number_of_backups)
+        stats.deltas.append(float(delta))
+        stats.converged = bool(delta < self._theta)
+
+    def _end_convergence_stats(self):
+        self._convergence_stats.time_in_seconds = time.perf_counter() - self._convergence_start_time
+
+    # The backup scheme recorded in the statistics
+    def _current_backup_scheme(self):
+        if (self._use_vectorised_engine is True) or \
+            (self._policy_evaluation_mode == PolicyEvaluationMode.LINEAR_SOLVE):
+            return self._backup_scheme
+        return None
+
     # Solve for the policy. Note that because v and pi are stored separately,
     # this method can be repeatedly called to update / continue computing the solution.
     def solve_policy(self):
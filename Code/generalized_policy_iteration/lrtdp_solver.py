@@ -0,0 +1,315 @@
+# This class implements labelled real-time dynamic programming (LRTDP,
+# Bonet and Geffner 2003). Rather than solving for every state, it only
+# solves for the states which the greedy policy can reach from a set of
+# start cells.
+#
+# Each trial starts at a start cell and follows the greedy policy, backing
+# up each state it visits and sampling the outcome of each action, until it
+# reaches a state which is labelled as solved. A state is solved when the
+# greedy policy from it only leads to states whose values change by less
+# than theta when they are backed up. The trials stop when all the start
+# cells are solved.
+#
+# The states the trial visited are then checked, from the end backwards.
+# Checking a state backs up every state in its greedy envelope once. If the
+# check fails, the state is checked again a few times before a new trial is
+# started, which converges the envelope without walking to it again from
+# the start cell. As in PrioritizedSweepingValueIterator, the backups solve
+# for the value of staying in the same state exactly.
+#
+# The values start from the deterministic values of the compiled
+# transition model - the values if the robot could choose the outcome of
+# each action. These are never less than the optimal values, so states
+# which look bad are never explored.
+#
+# Only the states which were backed up are stored in the value function
+# and the policy. The convergence statistics count the trials, rather than
+# sweeps, and the number of different states which were backed up. The
+# on_sweep hook is called after each trial.
+
+import random
+
+import numpy as np
+
+from .dynamic_programming_base import DynamicProgrammingBase
+
+
+class LRTDPSolver(DynamicProgrammingBase):
+
+    def __init__(self, environment):
+        DynamicProgrammingBase.__init__(self, environment)
+
+        # The cells to solve from. If None, all the states are solved.
+        self._start_cells = None
+
+        # The maximum number of trials, and the maximum number of steps in
+        # each trial
+        self._max_trials = 100000
+        self._max_trial_length = 10000
+
+        # The number of times a state which fails the check is checked again
+        # before a new trial is started
+        self._max_check_repetitions = 10
+
+        self._random = random.Random()
+
+        # The state of the last solve
+        self._model = None
+        self._solved = None
+
+    # Set the (x, y) coordinates of the cells to solve from
+    def set_start_cells(self, start_cells):
+        self._start_cells = start_cells
+
+    def start_cells(self):
+        return self._start_cells
+
+    def set_max_trials(self, max_trials):
+        self._max_trials = max_trials
+
+    def set_max_trial_length(self, max_trial_length):
+        self._max_trial_length = max_trial_length
+
+    def set_max_check_repetitions(self, max_check_repetitions):
+        self._max_check_repetitions = max_check_repetitions
+
+    # Seed the generator used to sample the outcomes of the actions
+    def set_random_seed(self, seed):
+        self._random.seed(seed)
+
+    # Is the cell at (x, y) labelled as solved by the last solve?
+    def is_solved(self, x, y):
+        if self._model is None:
+            return False
+        s = self._model.state_index()[x, y]
+        return (s >= 0) and (self._solved[s] is True)
+
+    def solve_policy(self):
+
+        # Initialize the drawers
+        if self._policy_drawer is not None:
+            self._policy_drawer.update()
+
+        if self._value_drawer is not None:
+            self._value_drawer.update()
+
+        self._begin_convergence_stats(None)
+
+        model = self._environment.compiled_transition_model()
+        self._model = model
+        self._row_outcomes = model.row_outcomes()
+        self._number_of_actions = model.number_of_actions()
+
+        # The values start from the deterministic values. States which can't
+        # reach a terminal state have a value of -inf, which is exact.
+        heuristic = model.deterministic_values(self._gamma)
+        self._values = np.where(model.is_terminal(), model.terminal_values(), heuristic).tolist()
+        self._solved = (model.is_terminal() | np.isneginf(heuristic)).tolist()
+        self._backed_up = [False] * len(self._values)
+        self._state_rows = [None] * len(self._values)
+
+        if self._start_cells is None:
+            starts = np.flatnonzero(~model.is_terminal()).tolist()
+        else:
+            starts = []
+            for x, y in self._start_cells:
+                s = int(model.state_index()[x, y])
+                if s < 0:
+                    raise ValueError(f'The start cell {(x, y)} is obstructed')
+                starts.append(s)
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
+        stats = self._convergence_stats
+        stats.number_of_trials = 0
+        for start in starts:
+            while (self._solved[start] is False) and (stats.number_of_trials < self._max_trials):
+                delta, backups = self._run_trial(start)
+
+                stats.number_of_trials += 1
+                stats.number_of_backups += backups
+                stats.deltas.append(float(delta))
+                if on_sweep is not None:
+                    on_sweep(self, delta)
+
+                if self._verbose is True:
+                    print(f'Finished trial {stats.number_of_trials}')
+
+        if (stats.number_of_trials == 0) and (on_sweep is not None):
+            on_sweep(self, 0)
+        stats.converged = all(self._solved[start] for start in starts)
+        stats.number_of_states_backed_up = sum(self._backed_up)
+
+        if (stats.converged is False) and (self._verbose is True):
+            print('Maximum number of trials exceeded')
+
+        self._store_backed_up_states()
+
+        self._end_convergence_stats()
+
+        on_policy_update = self._hooks.dispatcher('on_policy_update')
+        if on_policy_update is not None:
+            on_policy_update(self)
+
+        # Draw one last time to clear any transients which might
+        # draw changes
+        if self._policy_drawer is not None:
+            self._policy_drawer.update()
+
+        if self._value_drawer is not None:
+            self._value_drawer.update()
+
+        return self._v, self._pi
+
+    # Run one trial from the start state. Returns the largest change in the
+    # values and the number of backups.
+    def _run_trial(self, start):
+        delta = 0
+        backups = 0
+
+        # Follow the greedy policy until a solved state is reached
+        visited = []
+        s = start
+        while (self._solved[s] is False) and (len(visited) < self._max_trial_length):
+            visited.append(s)
+            best_q, best_row = self._backup_of_state(s)
+            delta = max(delta, abs(best_q - self._values[s]))
+            self._values[s] = best_q
+            self._backed_up[s] = True
+            backups += 1
+            s = self._sample_next_state(best_row)
+
+        # Label the states which are solved, from the end of the trial
+        # backwards. Once a state is not solved, the states before it
+        # can't be.
+        while len(visited) > 0:
+            s = visited.pop()
+            for _ in range(self._max_check_repetitions + 1):
+                solved, check_delta, check_backups = self._check_solved(s)
+                delta = max(delta, check_delta)
+                backups += check_backups
+                if solved is True:
+                    break
+            if solved is False:
+                break
+
+        return delta, backups
+
+    # Check if the state, and all the states the greedy policy can reach
+    # from it, have converged. Each state is backed up once as it is
+    # checked. If none of the values changed by theta or more, the states
+    # are labelled as solved. Returns whether the state is solved, the
+    # largest change in the values and the number of backups.
+    def _check_solved(self, s):
+        if self._solved[s] is True:
+            return True, 0, 0
+
+        solved = True
+        open_states = [s]
+        closed_states = []
+        seen = {s}
+        delta = 0
+
+        while len(open_states) > 0:
+            s = open_states.pop()
+            closed_states.append(s)
+
+            best_q, best_row = self._backup_of_state(s)
+            change = abs(best_q - self._values[s])
+            delta = max(delta, change)
+            self._values[s] = best_q
+            self._backed_up[s] = True
+            if change >= self._theta:
+                solved = False
+                continue
+
+            for s_prime in self._row_outcomes[best_row][1]:
+                if (self._solved[s_prime] is False) and (s_prime not in seen):
+                    seen.add(s_prime)
+                    open_states.append(s_prime)
+
+        if solved is True:
+            for s in closed_states:
+                self._solved[s] = True
+
+        return solved, delta, len(closed_states)
+
+    # Back up the state, solving for the value of staying in the same state
+    # exactly. This has the same fixed point as the usual backup, but
+    # states next to walls converge in far fewer backups. Returns the best
+    # value and the row of the transition model of the best action.
+    def _backup_of_state(self, s):
+        rows = self._state_rows[s]
+        if rows is None:
+            rows = self._compute_state_rows(s)
+            self._state_rows[s] = rows
+
+        values = self._values
+        best_q = -float('inf')
+        best_row = s * self._number_of_actions
+        for expected_reward, other_outcomes, scale, row in rows:
+            q = expected_reward
+            for s_prime, discounted_p in other_outcomes:
+                q += discounted_p * values[s_prime]
+            q /= scale
+            if q > best_q:
+                best_q = q
+                best_row = row
+        return best_q, best_row
+
+    # For each action, the outcomes which lead to other states and
+    # 1 - gamma * p(s|s,a). Actions which can't leave the state are skipped
+    # if gamma is 1.
+    def _compute_state_rows(self, s):
+        rows = []
+        for row in range(s * self._number_of_actions, (s + 1) * self._number_of_actions):
+            expected_reward, next_states, probabilities = self._row_outcomes[row]
+            stay_probability = 0
+            other_outcomes = []
+            for s_prime, p in zip(next_states, probabilities):
+                if s_prime == s:
+                    stay_probability += p
+                else:
+                    other_outcomes.append((s_prime, self._gamma * p))
+            scale = 1 - self._gamma * stay_probability
+            if scale > 1e-12:
+                rows.append((expected_reward, other_outcomes, scale, row))
+        return rows
+
+    # The best Q value of the state, and the row of the transition model of
+    # the best action, using the usual backup. Ties go to the lowest
+    # numbered action. This is used to extract the policy.
+    def _greedy_backup_of_state(self, s):
+        gamma = self._gamma
+        values = self._values
+        best_q = -float('inf')
+        best_row = s * self._number_of_actions
+        for row in range(s * self._number_of_actions, (s + 1) * self._number_of_actions):
+            expected_reward, next_states, probabilities = self._row_outcomes[row]
+            q = expected_reward
+            for s_prime, p in zip(next_states, probabilities):
+                q += gamma * p * values[s_prime]
+            if q > best_q:
+                best_q = q
+                best_row = row
+        return best_q, best_row
+
+    def _sample_next_state(self, row):
+        _, next_states, probabilities = self._row_outcomes[row]
+        sample = self._random.random()
+        for s_prime, p in zip(next_states, probabilities):
+            sample -= p
+            if sample < 0:
+                return s_prime
+        return next_states[-1]
+
+    # Store the values and greedy actions of the states which were backed up
+    def _store_backed_up_states(self):
+        model = self._model
+        value_array = self._v.value_array()
+        for s, (x, y) in enumerate(model.state_coords().tolist()):
+            if self._backed_up[s] is False:
+                continue
+            value_array[x, y] = self._values[s]
+            _, best_row = self._greedy_backup_of_state(s)
+            self._pi.set_action(x, y, best_row - s * self._number_of_actions)
@@ -4,7 +4,7 @@ Created on 31 Jan 2023
 @author: ucacsjj
 '''
 
-from .dynamic_programming_base import DynamicProgrammingBase
+from .dynamic_programming_base import DynamicProgrammingBase, PolicyEvaluationMode
 
 
 class PolicyEvaluator(DynamicProgrammingBase):
@@ -26,12 +26,32 @@ class PolicyEvaluator(DynamicProgrammingBase):
         self.initialize()
         
         
+    # Evaluate the policy. Returns True if the value function converged.
     def evaluate(self):
+        self._begin_convergence_stats(self._current_backup_scheme())
+        cold_start_pi = self._apply_warm_start()
+        converged = self._evaluate()
+        self._end_convergence_stats()
+
+        if cold_start_pi is not None:
+            self._record_sweeps_saved(cold_start_pi, PolicyEvaluator.evaluate)
+
+        return converged
+
+    def _evaluate(self):
+
+        if self._policy_evaluation_mode == PolicyEvaluationMode.LINEAR_SOLVE:
+            return self._evaluate_policy_linear_solve(self._max_policy_evaluation_steps_per_iteration)
+
+        if self._use_vectorised_engine is True:
+            return self._evaluate_policy_vectorised(self._max_policy_evaluation_steps_per_iteration)
         
         # Get the environment and map
         environment = self._environment
         map = environment.map()
         
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
         # Execute the loop at least once
         
         iteration = 0
@@ -39,6 +59,7 @@ class PolicyEvaluator(DynamicProgrammingBase):
         while True:
             
             delta = 0
+            backups = 0
 
             # Sweep systematically over all the states            
             for x in range(map.width()):
@@ -75,11 +96,18 @@ class PolicyEvaluator(DynamicProgrammingBase):
                                         
                     # Update the maximum deviation
                     delta = max(delta, abs(old_v-new_v))
+                    backups += 1
+
+            self._record_sweep(delta, backups)
  
+            if on_sweep is not None:
+                on_sweep(self, delta)
+
             # Increment the policy evaluation counter        
             iteration += 1
                        
-            print(f'Finished policy evaluation iteration {iteration}')
+            if self._verbose is True:
+                print(f'Finished policy evaluation iteration {iteration}')
             
             # Terminate the loop if the change was very small
             if delta < self._theta:
@@ -88,7 +116,8 @@ class PolicyEvaluator(DynamicProgrammingBase):
             # Terminate the loop if the maximum number of iterations is met. Generate
             # a warning
             if iteration >= self._max_policy_evaluation_steps_per_iteration:
-                print('Maximum number of iterations exceeded')
+                if self._verbose is True:
+                    print('Maximum number of iterations exceeded')
                 return False
             
                         
@@ -8,7 +8,9 @@ Created on 29 Jan 2022
 
 import copy
 
-from .dynamic_programming_base import DynamicProgrammingBase
+import numpy as np
+
+from .dynamic_programming_base import DynamicProgrammingBase, PolicyEvaluationMode
 
 
 class PolicyIterator(DynamicProgrammingBase):
@@ -30,7 +32,9 @@ class PolicyIterator(DynamicProgrammingBase):
     # a copy of the state value function. Since this is a deep copy, you can modify it
     # however you like.
     def evaluate_policy(self):
+        self._begin_convergence_stats(self._current_backup_scheme())
         self._evaluate_policy()
+        self._end_convergence_stats()
         
         #v = copy.deepcopy(self._v)
         
@@ -48,6 +52,18 @@ class PolicyIterator(DynamicProgrammingBase):
         # Reset termination indicators       
         policy_iteration_step = 0        
         policy_stable = False
+
+        on_policy_update = self._hooks.dispatcher('on_policy_update')
+
+        self._begin_convergence_stats(self._current_backup_scheme())
+        cold_start_pi = self._apply_warm_start()
+
+        # If the transitions are deterministic, the optimal policy can be
+        # found directly
+        if self._solve_deterministically() is True:
+            policy_stable = True
+            if on_policy_update is not None:
+                on_policy_update(self)
         
         # Loop until either the policy converges or we ran out of steps        
         while (policy_stable is False) and \
@@ -58,6 +74,8 @@ class PolicyIterator(DynamicProgrammingBase):
 
             # Improve the policy            
             policy_stable = self._improve_policy()
+            if on_policy_update is not None:
+                on_policy_update(self)
             
             # Update the drawers if needed
             if self._policy_drawer is not None:
@@ -68,6 +86,11 @@ class PolicyIterator(DynamicProgrammingBase):
                 
             policy_iteration_step += 1
 
+        self._end_convergence_stats()
+
+        if cold_start_pi is not None:
+            self._record_sweeps_saved(cold_start_pi)
+
         # Draw one last time to clear any transients which might
         # draw changes
         if self._policy_drawer is not None:
@@ -81,11 +104,21 @@ class PolicyIterator(DynamicProgrammingBase):
 
         
     def _evaluate_policy(self):
+
+        if self._policy_evaluation_mode == PolicyEvaluationMode.LINEAR_SOLVE:
+            self._evaluate_policy_linear_solve(self._max_policy_evaluation_steps_per_iteration)
+            return
+
+        if self._use_vectorised_engine is True:
+            self._evaluate_policy_vectorised(self._max_policy_evaluation_steps_per_iteration)
+            return
         
         # Get the environment and map
         environment = self._environment
         map = environment.map()
         
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
         # Execute the loop at least once
         
         iteration = 0
@@ -93,6 +126,7 @@ class PolicyIterator(DynamicProgrammingBase):
         while True:
             
             delta = 0
+            backups = 0
 
             # Sweep systematically over all the states            
             for x in range(map.width()):
@@ -129,11 +163,18 @@ class PolicyIterator(DynamicProgrammingBase):
                                         
                     # Update the maximum deviation
                     delta = max(delta, abs(old_v-new_v))
+                    backups += 1
+
+            self._record_sweep(delta, backups)
  
+            if on_sweep is not None:
+                on_sweep(self, delta)
+
             # Increment the policy evaluation counter        
             iteration += 1
                        
-            print(f'Finished policy evaluation iteration {iteration}')
+            if self._verbose is True:
+                print(f'Finished policy evaluation iteration {iteration}')
             
             # Terminate the loop if the change was very small
             if delta < self._theta:
@@ -142,11 +183,16 @@ class PolicyIterator(DynamicProgrammingBase):
             # Terminate the loop if the maximum number of iterations is met. Generate
             # a warning
             if iteration >= self._max_policy_evaluation_steps_per_iteration:
-                print('Maximum number of iterations exceeded')
+                if self._verbose is True:
+                    print('Maximum number of iterations exceeded')
                 break
 
     
     def _improve_policy(self) -> bool:
+
+        if self._use_vectorised_engine is True:
+            return self._improve_policy_vectorised()
+
         # Get the environment and map
         environment = self._environment
         map = environment.map()
@@ -191,6 +237,22 @@ class PolicyIterator(DynamicProgrammingBase):
         return policy_stable
       
                 
+    # The same as _improve_policy, but with the greedy actions for all the
+    # states computed at once over the compiled transition model
+    def _improve_policy_vectorised(self) -> bool:
+        model = self._environment.compiled_transition_model()
+        non_terminal = ~model.is_terminal()
+
+        current_actions = self._state_actions(model)
+        _, best_actions = self._greedy_backup(model, self._state_values(model))
+
+        changed = non_terminal & (best_actions != current_actions)
+        if np.any(changed):
+            self._store_state_actions(model, np.where(changed, best_actions, current_actions))
+            return False
+
+        return True
+
     def set_max_policy_evaluation_steps_per_iteration(self, \
                                                       max_policy_evaluation_steps_per_iteration):
             self._max_policy_evaluation_steps_per_iteration = max_policy_evaluation_steps_per_iteration
@@ -0,0 +1,147 @@
+# This class implements value iteration with prioritized sweeping. Rather
+# than sweeping over all the states, it keeps a priority queue of the
+# states ordered by their Bellman error - how much their value would change
+# if they were backed up - and only backs up the state with the largest
+# error. When the value of a state changes, the errors of its predecessors
+# are recomputed and they are queued again. The search stops when no state
+# has an error of theta or more.
+#
+# It works over the environment's compiled transition model. Every
+# number_of_states backups count as one sweep for the convergence
+# statistics and the on_sweep hook, where the delta is the largest error
+# backed up during the sweep.
+
+import heapq
+import itertools
+
+import numpy as np
+
+from .value_iterator import ValueIterator
+
+
+class PrioritizedSweepingValueIterator(ValueIterator):
+
+    def __init__(self, environment):
+        ValueIterator.__init__(self, environment)
+
+    # The solver always works over the compiled model, and has no sweep order
+    def _current_backup_scheme(self):
+        return None
+
+    def _compute_optimal_value_function(self):
+
+        model = self._environment.compiled_transition_model()
+        non_terminal = ~model.is_terminal()
+        number_of_non_terminal_states = int(np.count_nonzero(non_terminal))
+
+        row_outcomes = model.row_outcomes()
+        number_of_actions = model.number_of_actions()
+        gamma = self._gamma
+        theta = self._theta
+
+        # The predecessors of each state
+        predecessors = model.state_graph().T.tocsr()
+        predecessor_indptr = predecessors.indptr.tolist()
+        predecessor_indices = predecessors.indices.tolist()
+        is_non_terminal = non_terminal.tolist()
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
+        values = self._state_values(model)
+        v = values.tolist()
+
+        # For each state and action, the outcomes which lead to other states
+        # and 1 - gamma * p(s|s,a). Solving for the value of staying in the
+        # same state exactly, rather than letting it converge geometrically
+        # over many backups, doesn't change the fixed point but saves a lot
+        # of backups of states next to walls. Actions which can't leave
+        # the state are skipped if gamma is 1.
+        state_rows = []
+        for s in range(len(v)):
+            rows = []
+            for row in range(s * number_of_actions, (s + 1) * number_of_actions):
+                expected_reward, next_states, probabilities = row_outcomes[row]
+                stay_probability = 0
+                other_outcomes = []
+                for s_prime, p in zip(next_states, probabilities):
+                    if s_prime == s:
+                        stay_probability += p
+                    else:
+                        other_outcomes.append((s_prime, gamma * p))
+                scale = 1 - gamma * stay_probability
+                if scale > 1e-12:
+                    rows.append((expected_reward, other_outcomes, scale))
+            state_rows.append(rows)
+
+        def best_value(s):
+            best = -float('inf')
+            for expected_reward, other_outcomes, scale in state_rows[s]:
+                q = expected_reward
+                for s_prime, discounted_p in other_outcomes:
+                    q += discounted_p * v[s_prime]
+                q /= scale
+                if q > best:
+                    best = q
+            return best
+
+        # The queue holds (-error, tie breaker, state). An entry is stale if
+        # its error is no longer the state's current error.
+        errors = [abs(best_value(s) - v[s]) if is_non_terminal[s] else 0 \
+                  for s in range(len(v))]
+        counter = itertools.count()
+        queue = [(-error, next(counter), s) for s, error in enumerate(errors) if error >= theta]
+        heapq.heapify(queue)
+
+        maximum_backups = self._max_optimal_value_function_iterations * number_of_non_terminal_states
+        backups = 0
+        sweep_backups = 0
+        sweep_delta = 0
+
+        while queue and (backups < maximum_backups):
+            negative_error, _, s = heapq.heappop(queue)
+            if -negative_error != errors[s]:
+                continue
+
+            new_v = best_value(s)
+            change = abs(new_v - v[s])
+            v[s] = new_v
+            errors[s] = 0
+
+            backups += 1
+            sweep_backups += 1
+            if change > sweep_delta:
+                sweep_delta = change
+
+            # The change to this state changes the errors of its predecessors
+            for index in range(predecessor_indptr[s], predecessor_indptr[s + 1]):
+                predecessor = predecessor_indices[index]
+                if is_non_terminal[predecessor] is False:
+                    continue
+                error = abs(best_value(predecessor) - v[predecessor])
+                if error != errors[predecessor]:
+                    errors[predecessor] = error
+                    if error >= theta:
+                        heapq.heappush(queue, (-error, next(counter), predecessor))
+
+            if sweep_backups == number_of_non_terminal_states:
+                self._record_sweep(sweep_delta, sweep_backups)
+                if on_sweep is not None:
+                    on_sweep(self, sweep_delta)
+                sweep_backups = 0
+                sweep_delta = 0
+
+        # Record the last, partial sweep
+        if (sweep_backups > 0) or (backups == 0):
+            self._record_sweep(sweep_delta, sweep_backups)
+            if on_sweep is not None:
+                on_sweep(self, sweep_delta)
+        self._convergence_stats.converged = max(errors, default = 0) < theta
+
+        values[:] = v
+        self._store_state_values(model, values)
+
+    # The policy is always extracted over the compiled model
+    def _extract_policy(self):
+        model = self._environment.compiled_transition_model()
+        _, actions = self._greedy_backup(model, self._state_values(model))
+        self._store_state_actions(model, actions)
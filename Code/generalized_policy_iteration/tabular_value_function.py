@@ -25,4 +25,9 @@ class TabularValueFunction(Grid):
         
     def value(self, x, y) -> float:
         return self._values[x, y]
+
+    # The (width, height) array which stores the values. Changes to the
+    # array change the value function.
+    def value_array(self) -> np.ndarray:
+        return self._values
        
@@ -4,7 +4,9 @@ Created on 29 Jan 2022
 @author: ucacsjj
 '''
 
-from .dynamic_programming_base import DynamicProgrammingBase
+import numpy as np
+
+from .dynamic_programming_base import BackupScheme, DynamicProgrammingBase
 
 # This class ipmlements the value iteration algorithm
 
@@ -30,10 +32,23 @@ class ValueIterator(DynamicProgrammingBase):
             
         if self._value_drawer is not None:
             self._value_drawer.update()
-        
-        self._compute_optimal_value_function()
+
+        self._begin_convergence_stats(self._current_backup_scheme())
+        cold_start_pi = self._apply_warm_start()
+
+        if self._solve_deterministically() is False:
+            self._compute_optimal_value_function()
  
-        self._extract_policy()
+            self._extract_policy()
+
+        self._end_convergence_stats()
+
+        if cold_start_pi is not None:
+            self._record_sweeps_saved(cold_start_pi)
+
+        on_policy_update = self._hooks.dispatcher('on_policy_update')
+        if on_policy_update is not None:
+            on_policy_update(self)
         
         # Draw one last time to clear any transients which might
         # draw changes
@@ -53,15 +68,22 @@ class ValueIterator(DynamicProgrammingBase):
         # This method returns no value.
         # The method updates self._v
 
+        if self._use_vectorised_engine is True:
+            self._compute_optimal_value_function_vectorised()
+            return
+
         # Get environment and map
         environment = self._environment
         map_ = environment.map()
 
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
         # Loop until the maximum number of iterations
         for _ in range(self._max_optimal_value_function_iterations):
 
             # Track the maximum change in the value function
             delta = 0
+            backups = 0
 
             # Sweep systematically over all the states
             for x in range(map_.width()):
@@ -100,16 +122,68 @@ class ValueIterator(DynamicProgrammingBase):
 
                     # Update the maximum deviation
                     delta = max(delta, abs(old_v - best_q))
+                    backups += 1
+
+            self._record_sweep(delta, backups)
+
+            if on_sweep is not None:
+                on_sweep(self, delta)
 
             # Terminate if the maximum change is small
             if delta < self._theta:
                 break
 
+    # The same as _compute_optimal_value_function, but the backups are
+    # computed over the compiled transition model using the backup scheme
+    def _compute_optimal_value_function_vectorised(self):
+
+        model = self._environment.compiled_transition_model()
+        non_terminal = ~model.is_terminal()
+
+        on_sweep = self._hooks.dispatcher('on_sweep')
+
+        values = self._state_values(model)
+
+        if self._backup_scheme == BackupScheme.TOPOLOGICAL:
+            self._solve_topologically(model, values, self._max_optimal_value_function_iterations)
+            self._store_state_values(model, values)
+            return
+
+        if self._backup_scheme != BackupScheme.JACOBI:
+            orders = self._sweep_orders(model)
+
+        for sweep in range(self._max_optimal_value_function_iterations):
+
+            if self._backup_scheme == BackupScheme.JACOBI:
+                best_q, _ = self._greedy_backup(model, values)
+                new_values = np.where(non_terminal, best_q, values)
+                delta = np.max(np.abs(new_values - values), initial = 0)
+                values = new_values
+                self._record_sweep(delta, np.count_nonzero(non_terminal))
+            else:
+                order = orders[sweep % len(orders)]
+                delta = self._sweep_in_place(model, values, order)
+                self._record_sweep(delta, len(order))
+
+            if on_sweep is not None:
+                on_sweep(self, delta)
+
+            if delta < self._theta:
+                break
+
+        self._store_state_values(model, values)
+
     def _extract_policy(self):
 
         # This method returns no value.
         # The policy is in self._pi
 
+        if self._use_vectorised_engine is True:
+            model = self._environment.compiled_transition_model()
+            _, actions = self._greedy_backup(model, self._state_values(model))
+            self._store_state_actions(model, actions)
+            return
+
         # Get environment and map
         environment = self._environment
         map_ = environment.map()
@@ -30,6 +30,9 @@ class BreadthFirstPlanner(PlannerBase):
         cell = self.fifoQueue.popleft()
         return cell
 
+    def queue_length(self) -> int:
+        return len(self.fifoQueue)
+
     def resolve_duplicate(self, cell: SearchGridCell, parent_cell: SearchGridCell):
         # Nothing to do in this case
         pass
@@ -1,3 +1,5 @@
+from .distance_transform import dilate_mask, euclidean_distance_transform, \
+    update_euclidean_distance_transform
 from .grid import Grid
 from .helpers import clamp
 
@@ -15,6 +17,19 @@ class CellGrid(Grid):
 
     def __init__(self, name, width, height):
         Grid.__init__(self, name, width, height)
+
+        # Counter which is incremented every time the contents of the grid
+        # change. It is used to invalidate arrays which are derived from
+        # the grid contents.
+        self._version = 0
+
+        # The cached arrays, stored as key -> (version, array)
+        self._array_cache = {}
+
+        # The obstruction mask and clearance map last computed, stored as
+        # (version, obstruction mask, clearance). This is kept separately
+        # from the other cached arrays because it is updated incrementally.
+        self._clearance = None
     
     def compute_transition_cost(self, last_coords, current_coords):
         raise NotImplementedError()        
@@ -27,6 +42,72 @@ class CellGrid(Grid):
     def set_cell(self, x, y, c):
         raise NotImplementedError()
     
-    def populate_search_grid(self):
+    # Fill in the search grid from the map. If the robot radius is
+    # greater than 0, the obstructions are inflated by the radius.
+    def populate_search_grid(self, search_grid, robot_radius = 0):
+        raise NotImplementedError()
+
+    # The version of the grid contents. This changes whenever the grid is edited.
+    def version(self):
+        return self._version
+
+    # Boolean array, indexed [x, y], which is True for cells the robot
+    # cannot enter.
+    def obstruction_mask(self):
+        raise NotImplementedError()
+
+    # The obstruction mask inflated by the radius of the robot's footprint,
+    # in the same units as the resolution. A cell is obstructed if the robot
+    # centred on it would overlap an obstructed cell centre. One mask is
+    # cached for each radius and rebuilt when the grid is edited.
+    def inflated_obstruction_mask(self, robot_radius = 0):
+        if robot_radius <= 0:
+            return self.obstruction_mask()
+
+        return self._cached_array(('inflated_obstruction_mask', robot_radius), lambda : \
+            dilate_mask(self.obstruction_mask(), robot_radius / self.resolution()))
+
+    # Array, indexed [x, y], of the multiplier applied to the length of
+    # a step which enters each cell.
+    def traversability_cost_array(self):
         raise NotImplementedError()
 
+    # Array, indexed [x, y], of the distance from the centre of each cell to
+    # the centre of the nearest obstructed cell. Obstructed cells have a
+    # clearance of 0 and, if there are no obstructions, the clearance is
+    # infinite. The units are the same as the resolution. When the map is
+    # edited, only the clearances affected by the changed cells are
+    # recomputed.
+    def clearance_map(self):
+        if (self._clearance is not None) and (self._clearance[0] == self._version):
+            return self._clearance[2]
+
+        obstruction_mask = self.obstruction_mask()
+
+        if self._clearance is None:
+            distance = euclidean_distance_transform(obstruction_mask)
+        else:
+            distance = update_euclidean_distance_transform(self._clearance[2] / self.resolution(), \
+                                                           self._clearance[1], obstruction_mask)
+
+        clearance = distance * self.resolution()
+        clearance.flags.writeable = False
+        self._clearance = (self._version, obstruction_mask, clearance)
+
+        return clearance
+
+    # Flag that the grid contents have changed
+    def _increment_version(self):
+        self._version += 1
+
+    # Return an array derived from the grid, rebuilding it only if the grid
+    # has been edited since it was last built. The array is shared between
+    # all callers and so it is made read only.
+    def _cached_array(self, key, builder):
+        entry = self._array_cache.get(key)
+        if (entry is None) or (entry[0] != self._version):
+            array = builder()
+            array.flags.writeable = False
+            entry = (self._version, array)
+            self._array_cache[key] = entry
+        return entry[1]
@@ -0,0 +1,72 @@
+import math
+
+from .cell_grid import CellGrid
+from .search_grid import SearchGridCell
+
+# This class is an immutable snapshot of an environment map, prepared for
+# planning with a robot of a given radius. Everything the planners need is
+# computed once, when the map is compiled, and is never changed afterwards.
+# This means that a single compiled map can be shared by any number of
+# threads or asyncio tasks, which plan on it at the same time without
+# locks. If the original map is edited, compile it again.
+
+class CompiledMap(CellGrid):
+
+    def __init__(self, environment_map: CellGrid, robot_radius = 0):
+        CellGrid.__init__(self, environment_map.name(), environment_map.width(), environment_map.height())
+
+        self._resolution = environment_map.resolution()
+        self._version = environment_map.version()
+        self._robot_radius = robot_radius
+
+        # The arrays are read only
+        self._obstruction_mask = environment_map.inflated_obstruction_mask(robot_radius)
+        self._traversability_cost_array = environment_map.traversability_cost_array()
+        self._clearance_map = environment_map.clearance_map()
+
+        # Plain lists for building the search grids quickly
+        self._blocked = tuple(tuple(column) for column in self._obstruction_mask.tolist())
+        self._traversability_costs = tuple(tuple(column) for column in \
+                                           self._traversability_cost_array.tolist())
+
+    def resolution(self):
+        return self._resolution
+
+    # The radius of the robot the map was compiled for
+    def robot_radius(self):
+        return self._robot_radius
+
+    def is_obstruction(self, x, y):
+        return self._blocked[x][y]
+
+    # The obstruction mask is already inflated by the robot's radius
+    def obstruction_mask(self):
+        return self._obstruction_mask
+
+    # The map can only be used with the radius it was compiled for. A
+    # radius of 0 is treated as the compiled radius.
+    def inflated_obstruction_mask(self, robot_radius = 0):
+        if (robot_radius != 0) and (robot_radius != self._robot_radius):
+            raise ValueError(f'The map was compiled for a robot radius of {self._robot_radius}, ' \
+                             f'not {robot_radius}')
+        return self._obstruction_mask
+
+    def traversability_cost_array(self):
+        return self._traversability_cost_array
+
+    def clearance_map(self):
+        return self._clearance_map
+
+    def compute_transition_cost(self, last_coords, current_coords):
+        dX = current_coords[0] - last_coords[0]
+        dY = current_coords[1] - last_coords[1]
+        return math.sqrt(dX * dX + dY * dY) * self._traversability_costs[current_coords[0]][current_coords[1]]
+
+    def populate_search_grid(self, search_grid, robot_radius = 0):
+        # Check the radius is the one the map was compiled for
+        self.inflated_obstruction_mask(robot_radius)
+
+        grid = [[SearchGridCell((x, y), self._blocked[x][y]) for y in range(self._height)] \
+                     for x in range(self._width)]
+
+        search_grid._set_search_grid(grid)
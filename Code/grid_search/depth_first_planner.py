@@ -27,6 +27,9 @@ class DepthFirstPlanner(PlannerBase):
         cell = self.lifoQueue.pop()
         return cell
 
+    def queue_length(self) -> int:
+        return len(self.lifoQueue)
+
     def resolve_duplicate(self, cell: SearchGridCell, parent_cell: SearchGridCell):
         # Nothing to do in this case
         pass
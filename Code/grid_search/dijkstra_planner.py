@@ -19,6 +19,9 @@ class DijkstraPlanner(PlannerBase):
         _, cell = self.priority_queue.get()
         return cell
 
+    def queue_length(self) -> int:
+        return self.priority_queue.qsize()
+
     def resolve_duplicate(self, cell: SearchGridCell, parent_cell: SearchGridCell):
         new_cost = parent_cell.path_cost + 1
         if new_cost < cell.path_cost:
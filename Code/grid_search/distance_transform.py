@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+
+# These functions compute Euclidean distance transforms of boolean masks
+# indexed [x, y]. The distance of a cell is the distance between its centre
+# and the centre of the nearest cell which is set in the mask, so cells in
+# the mask have a distance of 0. If the mask is empty, every distance is
+# infinite. All distances are in cells; multiply by the resolution to get
+# metres.
+
+# The maximum number of elements in the temporary arrays used by the
+# vectorised minimisations. This bounds the memory used on large maps.
+_MAXIMUM_BLOCK_SIZE = 1 << 22
+
+# Compute the exact Euclidean distance transform. This uses the separable
+# formulation: first, the distance to the nearest set cell in the same
+# column is found; then, along each row, the squared distance is the
+# minimum over all columns of the horizontal offset squared plus the
+# column distance squared. Both passes are vectorised.
+def euclidean_distance_transform(mask: np.ndarray) -> np.ndarray:
+    width, height = mask.shape
+
+    if not mask.any():
+        return np.full(mask.shape, math.inf)
+
+    # Pass 1: the distance to the nearest set cell in the same column
+    y = np.arange(height)
+    previous = np.maximum.accumulate(np.where(mask, y, -2 * height), axis = 1)
+    following = np.flip(np.minimum.accumulate(np.flip(np.where(mask, y, 3 * height), axis = 1), axis = 1), axis = 1)
+    column_distance = np.minimum(y - previous, following - y).astype(float)
+    column_distance[~mask.any(axis = 1), :] = math.inf
+    column_distance_squared = column_distance * column_distance
+
+    # Pass 2: minimise along the rows. The work is split into blocks of
+    # x values so that the (block, width, height) temporary stays small.
+    x = np.arange(width)
+    squared_distance = np.empty(mask.shape)
+    block = max(1, _MAXIMUM_BLOCK_SIZE // (width * height))
+    for start in range(0, width, block):
+        end = min(start + block, width)
+        offset = (x[start:end, np.newaxis] - x[np.newaxis, :]).astype(float)
+        candidates = offset[:, :, np.newaxis] ** 2 + column_distance_squared[np.newaxis, :, :]
+        squared_distance[start:end] = candidates.min(axis = 1)
+
+    return np.sqrt(squared_distance)
+
+# Compute the distance from every cell to the nearest of a small set of
+# cells, given by their coordinates. This is used to update a distance
+# transform when only a few cells change.
+def distance_to_cells(shape, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    if len(xs) == 0:
+        return np.full(shape, math.inf)
+
+    grid_x = np.arange(shape[0])[:, np.newaxis]
+    grid_y = np.arange(shape[1])[np.newaxis, :]
+    squared_distance = np.full(shape, math.inf)
+    block = max(1, _MAXIMUM_BLOCK_SIZE // (shape[0] * shape[1]))
+    for start in range(0, len(xs), block):
+        dx = grid_x[np.newaxis] - xs[start:start + block, np.newaxis, np.newaxis]
+        dy = grid_y[np.newaxis] - ys[start:start + block, np.newaxis, np.newaxis]
+        squared_distance = np.minimum(squared_distance, (dx * dx + dy * dy).min(axis = 0))
+
+    return np.sqrt(squared_distance)
+
+# Update a distance transform after the mask has been edited. Cells which
+# have been added to the mask can only reduce the distances, so the new
+# distances are the minimum of the old ones and the distances to the added
+# cells. Cells which have been removed only affect the cells whose nearest
+# set cell was a removed one; those are recomputed against the remaining
+# mask. If the edit is large, the full transform is recomputed instead
+# because it is cheaper.
+def update_euclidean_distance_transform(distance: np.ndarray, old_mask: np.ndarray, \
+                                        new_mask: np.ndarray) -> np.ndarray:
+
+    added = new_mask & ~old_mask
+    removed = old_mask & ~new_mask
+
+    number_of_cells = new_mask.size
+    if (added.sum() + removed.sum()) * 8 > number_of_cells:
+        return euclidean_distance_transform(new_mask)
+
+    distance = distance.copy()
+
+    if removed.any():
+        removed_x, removed_y = np.nonzero(removed)
+        distance_to_removed = distance_to_cells(new_mask.shape, removed_x, removed_y)
+        affected = np.isclose(distance, distance_to_removed)
+        mask_x, mask_y = np.nonzero(new_mask)
+        affected_x, affected_y = np.nonzero(affected)
+
+        # If many cells are affected, the brute force update is slower than
+        # starting again
+        if len(affected_x) * len(mask_x) > _MAXIMUM_BLOCK_SIZE:
+            return euclidean_distance_transform(new_mask)
+
+        if len(mask_x) == 0:
+            distance[affected] = math.inf
+        else:
+            dx = affected_x[:, np.newaxis] - mask_x[np.newaxis, :]
+            dy = affected_y[:, np.newaxis] - mask_y[np.newaxis, :]
+            distance[affected] = np.sqrt((dx * dx + dy * dy).min(axis = 1))
+
+    if added.any():
+        added_x, added_y = np.nonzero(added)
+        distance = np.minimum(distance, distance_to_cells(new_mask.shape, added_x, added_y))
+
+    return distance
+
+# Dilate a mask by a disc of the given radius in cells. A cell is set in
+# the result if its centre lies within the radius of the centre of a set
+# cell. The dilation is done by OR-ing shifted copies of the mask, one for
+# each offset inside the disc.
+def dilate_mask(mask: np.ndarray, radius: float) -> np.ndarray:
+    width, height = mask.shape
+    reach = int(math.floor(radius))
+
+    dilated = mask.copy()
+    for dx in range(-reach, reach + 1):
+        for dy in range(-reach, reach + 1):
+            if ((dx == 0) and (dy == 0)) or (dx * dx + dy * dy > radius * radius):
+                continue
+            if (abs(dx) >= width) or (abs(dy) >= height):
+                continue
+            dilated[max(dx, 0):width + min(dx, 0), max(dy, 0):height + min(dy, 0)] |= \
+                mask[max(-dx, 0):width + min(-dx, 0), max(-dy, 0):height + min(-dy, 0)]
+
+    return dilated
@@ -0,0 +1,250 @@
+import heapq
+import math
+from typing import Tuple
+
+import numpy as np
+
+from .cell_grid import CellGrid
+from .planned_path import PlannedPath
+
+# This class computes a continuous cost-to-go field over the whole map by
+# solving the eikonal equation |grad T| = c(x, y) with the fast marching
+# method. The local cost c is the traversability cost of each cell, so the
+# field respects the per-cell-type costs but, unlike Dijkstra on the
+# 8-connected grid, is not restricted to the 45 degree steps.
+
+# Because the field gives the cost-to-go from every cell to the goal, a
+# single solve can be used to extract paths from any number of start
+# positions by descending the gradient of the field.
+
+# Cell states used by the fast marching method
+_FAR = 0
+_NARROW_BAND = 1
+_FROZEN = 2
+
+# Offsets of the 4-connected neighbours used by the upwind update
+_NEIGHBOUR_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+# Offsets of the 8-connected neighbours used for the discrete fallback
+# when descending the field
+_DESCENT_OFFSETS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+class FastMarchingSolver(object):
+
+    def __init__(self, environment_map: CellGrid):
+        self._environment_map = environment_map
+
+        # The size of each gradient descent step in cells
+        self._descent_step_size = 0.5
+
+        # The radius of the robot's footprint
+        self._robot_radius = 0
+
+        # The result of the last solve
+        self._goal_coords = None
+        self._cost_to_go = None
+        self._gradient = None
+
+    # Set the size of the gradient descent step, in cells
+    def set_descent_step_size(self, descent_step_size: float):
+        self._descent_step_size = descent_step_size
+
+    # Set the radius of the robot's footprint. This selects the inflated
+    # obstruction mask used by the solver.
+    def set_robot_radius(self, robot_radius: float):
+        self._robot_radius = robot_radius
+
+    # Solve for the cost-to-go field to the goal. The field is stored
+    # in an array indexed [x, y]; unreachable and obstructed cells are
+    # infinite.
+    def solve(self, goal_coords: Tuple[int, int]) -> np.ndarray:
+
+        environment_map = self._environment_map
+        width = environment_map.width()
+        height = environment_map.height()
+
+        # The local cost of moving through each cell. The narrow band only
+        # touches a few cells at a time, so the arrays are used as lists;
+        # indexing NumPy arrays one element at a time is much slower.
+        costs = (environment_map.traversability_cost_array() * environment_map.resolution()).tolist()
+        blocked = environment_map.inflated_obstruction_mask(self._robot_radius)
+
+        # The arrival times. These are padded by one cell on each side so
+        # that the neighbour lookups never fall off the edge of the grid.
+        # The padded array only contains the values of frozen cells; all
+        # other cells are infinite so they do not contribute to the
+        # upwind update.
+        frozen_times = [[math.inf] * (height + 2) for _ in range(width + 2)]
+        cost_to_go = [[math.inf] * height for _ in range(width)]
+        state = np.where(blocked, _FROZEN, _FAR).tolist()
+
+        self._goal_coords = tuple(goal_coords)
+        narrow_band = []
+
+        if blocked[goal_coords[0], goal_coords[1]] == False:
+            cost_to_go[goal_coords[0]][goal_coords[1]] = 0
+            state[goal_coords[0]][goal_coords[1]] = _NARROW_BAND
+            heapq.heappush(narrow_band, (0, goal_coords[0], goal_coords[1]))
+
+        while narrow_band:
+            t, x, y = heapq.heappop(narrow_band)
+
+            # Skip stale entries; a cell can be pushed several times as
+            # its arrival time improves
+            if state[x][y] == _FROZEN:
+                continue
+
+            state[x][y] = _FROZEN
+            frozen_times[x + 1][y + 1] = t
+
+            # Update the neighbours which are still to be frozen
+            for offset_x, offset_y in _NEIGHBOUR_OFFSETS:
+                nx = x + offset_x
+                ny = y + offset_y
+                if (nx < 0) or (nx >= width) or (ny < 0) or (ny >= height) or \
+                    (state[nx][ny] == _FROZEN):
+                    continue
+
+                new_t = self._upwind_update(frozen_times, costs[nx][ny], nx + 1, ny + 1)
+                if new_t < cost_to_go[nx][ny]:
+                    cost_to_go[nx][ny] = new_t
+                    state[nx][ny] = _NARROW_BAND
+                    heapq.heappush(narrow_band, (new_t, nx, ny))
+
+        cost_to_go = np.array(cost_to_go)
+        cost_to_go.flags.writeable = False
+        self._cost_to_go = cost_to_go
+        self._gradient = self._compute_gradient(cost_to_go)
+
+        return cost_to_go
+
+    # Return the cost-to-go field computed by the last solve
+    def cost_to_go_field(self) -> np.ndarray:
+        return self._cost_to_go
+
+    # Return the cost-to-go from a cell to the goal
+    def cost_to_go(self, coords: Tuple[int, int]) -> float:
+        return self._cost_to_go[coords[0], coords[1]]
+
+    # Extract the path from the start to the goal used in the last
+    # solve. The waypoints are (x, y) tuples in continuous cell
+    # coordinates, rather than SearchGridCells, because the path is not
+    # restricted to cell centres. The travel cost is the length of the
+    # path, which is the same as the one reported by the grid planners.
+    def extract_path(self, start_coords: Tuple[int, int]) -> PlannedPath:
+
+        path = PlannedPath()
+
+        cost_to_go = self._cost_to_go
+        goal = np.array(self._goal_coords, dtype = float)
+        position = np.array(start_coords, dtype = float)
+        path.waypoints.append((float(position[0]), float(position[1])))
+
+        if math.isinf(cost_to_go[start_coords[0], start_coords[1]]):
+            path.goal_reached = False
+            path.path_travel_cost = float('inf')
+            path.number_of_waypoints = len(path.waypoints)
+            return path
+
+        step_size = self._descent_step_size
+        blocked = self._environment_map.inflated_obstruction_mask(self._robot_radius)
+        cell = (int(start_coords[0]), int(start_coords[1]))
+        maximum_number_of_steps = 4 * cost_to_go.size
+
+        for _ in range(maximum_number_of_steps):
+
+            # Finish once we are in the goal cell or within a step of the goal
+            if (cell == self._goal_coords) or (np.linalg.norm(goal - position) <= step_size):
+                position = goal
+                path.goal_reached = True
+                path.waypoints.append((float(position[0]), float(position[1])))
+                break
+
+            # Take a step down the gradient of the field
+            gradient = self._gradient[:, cell[0], cell[1]]
+            norm = np.linalg.norm(gradient)
+            next_cell = None
+            if norm > 0:
+                next_position = position - step_size * gradient / norm
+                next_cell = (int(round(next_position[0])), int(round(next_position[1])))
+                if (next_cell[0] < 0) or (next_cell[0] >= cost_to_go.shape[0]) \
+                    or (next_cell[1] < 0) or (next_cell[1] >= cost_to_go.shape[1]) \
+                    or blocked[next_cell[0], next_cell[1]] \
+                    or (cost_to_go[next_cell] > cost_to_go[cell]):
+                    next_cell = None
+
+            # If the gradient step isn't usable (for example, it cuts a
+            # corner of an obstruction) move to the neighbouring cell
+            # with the lowest cost-to-go instead. This always decreases
+            # the cost-to-go, so the descent cannot get stuck.
+            if next_cell is None:
+                next_cell = self._best_neighbour(cell)
+                if next_cell is None:
+                    break
+                next_position = np.array(next_cell, dtype = float)
+
+            position = next_position
+            cell = next_cell
+            path.waypoints.append((float(position[0]), float(position[1])))
+
+        path.number_of_waypoints = len(path.waypoints)
+
+        if path.goal_reached is False:
+            path.path_travel_cost = float('inf')
+            return path
+
+        # The travel cost is the length of the path
+        waypoints = np.array(path.waypoints)
+        path.path_travel_cost = float(np.sum(np.linalg.norm(np.diff(waypoints, axis = 0), axis = 1)))
+
+        return path
+
+    # Solve the first order upwind discretisation of the eikonal equation
+    # for the cell at (px, py) in the padded arrival times.
+    def _upwind_update(self, frozen_times, cost, px, py):
+        a = min(frozen_times[px - 1][py], frozen_times[px + 1][py])
+        b = min(frozen_times[px][py - 1], frozen_times[px][py + 1])
+
+        # If the two directions differ by more than the cost, the front
+        # only arrives from one direction
+        difference = a - b
+        if math.isfinite(difference) and (abs(difference) < cost):
+            return 0.5 * (a + b + math.sqrt(2 * cost * cost - difference * difference))
+
+        return min(a, b) + cost
+
+    # Compute the upwind gradient of the field. In each direction, the
+    # difference is taken towards the neighbour with the lowest value so
+    # that the gradient never points into an obstruction.
+    def _compute_gradient(self, cost_to_go):
+        padded = np.pad(cost_to_go, 1, constant_values = math.inf)
+
+        gradient = np.zeros((2,) + cost_to_go.shape)
+
+        with np.errstate(invalid = 'ignore'):
+            for axis in range(2):
+                before = padded[:-2, 1:-1] if axis == 0 else padded[1:-1, :-2]
+                after = padded[2:, 1:-1] if axis == 0 else padded[1:-1, 2:]
+                backward = cost_to_go - before
+                forward = after - cost_to_go
+                component = np.where(before < after, backward, forward)
+                descending = np.minimum(before, after) < cost_to_go
+                gradient[axis] = np.where(descending & np.isfinite(component), component, 0)
+
+        return gradient
+
+    # Find the 8-connected neighbour with the lowest cost-to-go. Returns None
+    # if no neighbour is lower than the current cell.
+    def _best_neighbour(self, cell):
+        cost_to_go = self._cost_to_go
+        best_cell = None
+        best_cost = cost_to_go[cell[0], cell[1]]
+        for offset in _DESCENT_OFFSETS:
+            x = cell[0] + offset[0]
+            y = cell[1] + offset[1]
+            if (x < 0) or (x >= cost_to_go.shape[0]) or (y < 0) or (y >= cost_to_go.shape[1]):
+                continue
+            if cost_to_go[x, y] < best_cost:
+                best_cost = cost_to_go[x, y]
+                best_cell = (x, y)
+        return best_cell
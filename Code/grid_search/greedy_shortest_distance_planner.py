@@ -44,6 +44,9 @@ class GreedyShortestDistancePlanner(PlannerBase):
         t = self._priority_queue.get()
         return t[1]
 
+    def queue_length(self) -> int:
+        return self._priority_queue.qsize()
+
     def resolve_duplicate(self, cell: SearchGridCell, parent_cell: SearchGridCell):
         # Nothing to do in this case
         pass
@@ -0,0 +1,58 @@
+from typing import Callable, Optional
+
+# This class holds the callbacks which have been subscribed to a fixed set
+# of named events. It is used to instrument the planners and solvers
+# without changing their code.
+#
+# The algorithms don't call the registry on every event. Instead, at the
+# start of a run, they ask for a dispatcher for each event and keep it in
+# a local variable:
+#
+#     on_expand = self._hooks.dispatcher('on_expand')
+#     ...
+#     if on_expand is not None:
+#         on_expand(self, cell)
+#
+# The dispatcher is None if nothing is subscribed, so an event without
+# subscribers costs a single comparison. Callbacks which are added or
+# removed during a run take effect from the next run.
+
+class HookRegistry(object):
+
+    def __init__(self, events):
+        self._callbacks = {event : [] for event in events}
+
+    def events(self):
+        return tuple(self._callbacks.keys())
+
+    # Subscribe a callback to an event. The callback is returned so that
+    # this can be used as a decorator.
+    def add_hook(self, event: str, callback: Callable) -> Callable:
+        self._event_callbacks(event).append(callback)
+        return callback
+
+    def remove_hook(self, event: str, callback: Callable):
+        self._event_callbacks(event).remove(callback)
+
+    def has_hooks(self, event: str) -> bool:
+        return len(self._event_callbacks(event)) > 0
+
+    # Get a function which calls all the callbacks subscribed to the
+    # event, or None if there aren't any
+    def dispatcher(self, event: str) -> Optional[Callable]:
+        callbacks = tuple(self._event_callbacks(event))
+        if len(callbacks) == 0:
+            return None
+        if len(callbacks) == 1:
+            return callbacks[0]
+
+        def dispatch(*args):
+            for callback in callbacks:
+                callback(*args)
+        return dispatch
+
+    def _event_callbacks(self, event):
+        callbacks = self._callbacks.get(event)
+        if callbacks is None:
+            raise ValueError(f'Unknown event {event}; the events are {", ".join(self._callbacks)}')
+        return callbacks
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 from .cell_grid import CellGrid
 from .helpers import clamp
 from .search_grid import SearchGridCell
@@ -33,6 +35,7 @@ class OccupancyGrid(CellGrid):
     # Set the status of a cell.
     def set_cell(self, x, y, c):
         self._data[y][x] = c
+        self._increment_version()
     
     def compute_transition_cost(self, last_coords, current_coords):
         
@@ -60,8 +63,18 @@ class OccupancyGrid(CellGrid):
 
         return worldCoords
     
-    def populate_search_grid(self, search_grid):
-        grid = [[SearchGridCell((x, y), (self._data[y][x] > 0)) for y in range(self._height)] \
+    def obstruction_mask(self):
+        return self._cached_array('obstruction_mask', lambda : \
+            np.array(self._data).T > 0)
+
+    # All cells cost the same to traverse
+    def traversability_cost_array(self):
+        return self._cached_array('traversability_cost', lambda : \
+            np.ones((self._width, self._height)))
+
+    def populate_search_grid(self, search_grid, robot_radius = 0):
+        blocked = self.inflated_obstruction_mask(robot_radius).tolist()
+        grid = [[SearchGridCell((x, y), blocked[x][y]) for y in range(self._height)] \
                      for x in range(self._width)]
         
         search_grid._set_search_grid(grid)
@@ -0,0 +1,137 @@
+import numpy as np
+
+from .cell_grid import Cell, CellGrid
+from .line_of_sight import weighted_line_cost
+from .planned_path import PlannedPath
+
+# This class turns a path from one of the grid planners into a compact
+# array of waypoint coordinates which is suitable for sending to a robot.
+# It works in two stages:
+# 1. Runs of waypoints along the same direction are collapsed to their end
+#    points. This does not change the path at all.
+# 2. Waypoints are removed where the straight line between the remaining
+#    ones is clear and no more expensive than the part of the path it
+#    replaces. The part of the path is priced step by step with the map's
+#    transition cost, and the straight line is priced by charging its length
+#    inside each cell at that cell's cost. The two agree for a single step,
+#    so a shortcut never makes the path more expensive.
+
+# Waypoints which are cells, or integer coordinates, give an int32 array.
+# Fractional waypoints, such as the ones from FastMarchingSolver, keep
+# their float coordinates.
+
+# The simplified path holds no references to the search grid. Its travel
+# cost is the length of the simplified path, which is the same measure that
+# PlannerBase.extract_path uses.
+
+class PathSimplifier(object):
+
+    def __init__(self, environment_map: CellGrid):
+        self._environment_map = environment_map
+
+        # The radius of the robot's footprint. This should match the one
+        # used by the planner.
+        self._robot_radius = 0
+
+        # Flag to show if shortcuts should be taken
+        self._use_shortcuts = True
+
+    def set_robot_radius(self, robot_radius: float):
+        self._robot_radius = robot_radius
+
+    # Specify if shortcuts are taken, or if only collinear waypoints are removed
+    def set_use_shortcuts(self, use_shortcuts: bool):
+        self._use_shortcuts = use_shortcuts
+
+    def simplify(self, path: PlannedPath) -> PlannedPath:
+
+        if path.coordinates is not None:
+            coordinates = np.asarray(path.coordinates)
+        else:
+            coordinates = np.array([waypoint.coords() if isinstance(waypoint, Cell) else waypoint \
+                                    for waypoint in path.waypoints]).reshape(-1, 2)
+        if np.issubdtype(coordinates.dtype, np.integer):
+            coordinates = coordinates.astype(np.int32)
+
+        use_shortcuts = (self._use_shortcuts is True) and (path.goal_reached is True) \
+            and (len(coordinates) > 2)
+
+        # The cost of driving along the original path up to each waypoint.
+        # This has to be found before the collinear waypoints are removed.
+        if use_shortcuts is True:
+            cumulative_costs = self._cumulative_path_costs(coordinates)
+
+        if len(coordinates) > 2:
+            keep = self._collinear_waypoints_to_keep(coordinates)
+            coordinates = coordinates[keep]
+            if use_shortcuts is True:
+                cumulative_costs = cumulative_costs[keep]
+
+        if (use_shortcuts is True) and (len(coordinates) > 2):
+            coordinates = self._shortcut(coordinates, cumulative_costs)
+
+        simplified_path = PlannedPath()
+        simplified_path.goal_reached = path.goal_reached
+        simplified_path.coordinates = coordinates
+        simplified_path.number_of_waypoints = len(coordinates)
+        simplified_path.number_of_cells_visited = path.number_of_cells_visited
+        simplified_path.stats = path.stats
+
+        if path.goal_reached is False:
+            simplified_path.path_travel_cost = float('inf')
+        else:
+            simplified_path.path_travel_cost = \
+                float(np.sum(np.linalg.norm(np.diff(coordinates, axis = 0), axis = 1)))
+
+        return simplified_path
+
+    # The cost of driving along the path from the start to each waypoint
+    def _cumulative_path_costs(self, coordinates):
+        blocked = self._environment_map.inflated_obstruction_mask(self._robot_radius)
+        costs = self._environment_map.traversability_cost_array()
+        integer_steps = np.issubdtype(coordinates.dtype, np.integer)
+
+        step_costs = []
+        for i in range(len(coordinates) - 1):
+            start = coordinates[i]
+            end = coordinates[i + 1]
+            if (integer_steps is True) and (np.abs(end - start).max() <= 1):
+                step_costs.append(self._environment_map.compute_transition_cost( \
+                    (int(start[0]), int(start[1])), (int(end[0]), int(end[1]))))
+            else:
+                # Any-angle segments and fractional waypoints
+                step_costs.append(weighted_line_cost(blocked, costs, start, end))
+
+        return np.concatenate(([0], np.cumsum(step_costs)))
+
+    # Keep the end points and every waypoint where the direction changes
+    def _collinear_waypoints_to_keep(self, coordinates):
+        steps = np.diff(coordinates, axis = 0)
+        before = steps[:-1]
+        after = steps[1:]
+        cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+        dot = before[:, 0] * after[:, 0] + before[:, 1] * after[:, 1]
+        turns = (cross != 0) | (dot <= 0)
+
+        return np.concatenate(([True], turns, [True]))
+
+    # Greedily join each waypoint to the furthest later waypoint which can
+    # be reached directly without increasing the cost.
+    def _shortcut(self, coordinates, cumulative_costs):
+        blocked = self._environment_map.inflated_obstruction_mask(self._robot_radius)
+        costs = self._environment_map.traversability_cost_array()
+
+        keep = [0]
+        current = 0
+        last = len(coordinates) - 1
+        while current < last:
+            following = current + 1
+            for candidate in range(last, current + 1, -1):
+                shortcut_cost = weighted_line_cost(blocked, costs, coordinates[current], coordinates[candidate])
+                if shortcut_cost <= cumulative_costs[candidate] - cumulative_costs[current] + 1e-9:
+                    following = candidate
+                    break
+            keep.append(following)
+            current = following
+
+        return coordinates[keep]
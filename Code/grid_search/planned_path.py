@@ -15,6 +15,11 @@ class PlannedPath(object):
         # up the path.
         self.waypoints = deque()
 
+        # Compact (number_of_waypoints, 2) array of the waypoint
+        # coordinates. This is filled in by the path simplifier, which
+        # leaves the waypoints empty so the search grid can be freed.
+        self.coordinates = None
+
         # Performance information - number of waypoints, and the
         # travel cost of the path.
         self.number_of_waypoints = 0
@@ -22,3 +27,6 @@ class PlannedPath(object):
         
         # The number of cells visited to plan the path
         self.number_of_cells_visited = 0
+
+        # The PlanningStats of the search which found the path
+        self.stats = None
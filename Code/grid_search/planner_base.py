@@ -1,10 +1,15 @@
 import math
+import threading
 import time
+import tracemalloc
 from collections import deque
+from enum import Enum
 from typing import List, Optional, Tuple
 
 from .occupancy_grid import OccupancyGrid
+from .hooks import HookRegistry
 from .planned_path import PlannedPath
+from .planning_stats import PlanningStats
 from .search_grid import SearchGrid, SearchGridCell, SearchGridCellLabel
 from .search_grid_drawer import SearchGridDrawer
 
@@ -27,6 +32,29 @@ from .search_grid_drawer import SearchGridDrawer
 # internally constructs a SearchGrid. This contains the nodes and
 # edges from the planner and the labels associated with them.
 
+# The search itself is written as a generator, plan_iter(), which can be
+# stepped through a few cells at a time. This lets graphical front ends,
+# asyncio services and schedulers with a time budget interleave searches.
+# plan() runs it to completion, drawing as it goes if required.
+
+# The plan() method keeps the state of the search in the planner, so that
+# it can be drawn and inspected afterwards. To plan several paths at the
+# same time, use plan_path() instead. Each call runs in its own search
+# context - a planner of the same type which shares the map and the
+# settings but has its own search grid and queue. The contexts are kept
+# and reused by later calls. If the map is a CompiledMap, which never
+# changes, any number of threads can call plan_path() on the same planner
+# without locks.
+
+# The attributes of a planner which hold the state of a single search, or
+# which manage its search contexts. These are never copied into a search
+# context.
+_SEARCH_STATE_ATTRIBUTES = frozenset(('_search_grid', '_search_grid_drawer', '_goal_reached', \
+                                      '_planning_stats', 'start', 'goal', 'number_of_cells_visited', \
+                                      '_show_graphics', '_show_graphics_each_iteration', \
+                                      '_idle_search_contexts', '_search_context_lock', \
+                                      '_search_context_owned_attributes'))
+
 class PlannerBase(object):
 
     # Construct a new planner object and set defaults.
@@ -34,6 +62,10 @@ class PlannerBase(object):
         self._environment_map = environment_map;
         self._search_grid = None
 
+        # The radius of the robot's footprint. Cells closer than this to an
+        # obstruction are treated as obstructed.
+        self._robot_radius = 0
+
         # All these variables are used for controlling the graphics output
         self._pause_time_in_seconds = 0.05
         self._path_pause_time_in_seconds = 0.05
@@ -44,6 +76,27 @@ class PlannerBase(object):
         self._maximum_grid_drawer_window_height_in_pixels = 800
         self._draw_parent_arrows = True
 
+        # If set, the search events are recorded in this log
+        self._search_event_log = None
+
+        # The statistics of the last search. Memory use is only measured
+        # if tracking is enabled, because tracemalloc slows everything down.
+        self._planning_stats = None
+        self._track_memory = False
+
+        # If true, print the result of each search
+        self._verbose = False
+
+        # Callbacks for instrumenting the search. on_expand(planner, cell) is
+        # called after a cell has been expanded, and on_relax(planner, cell,
+        # parent_cell) after each neighbour of it has been pushed or had its
+        # duplicate resolved.
+        self._hooks = HookRegistry(('on_expand', 'on_relax'))
+
+        # The search contexts which are not in use by plan_path()
+        self._idle_search_contexts = []
+        self._search_context_lock = threading.Lock()
+
     # This method pushes a cell onto the queue Q. Its implementation
     # depends upon the type of search algorithm used. If necessary,
     # (self) could also do things like update path costs as well.
@@ -72,6 +125,11 @@ class PlannerBase(object):
     def pop_cell_from_queue(self) -> SearchGridCell:
         raise NotImplementedError()
 
+    # The number of entries on the queue. This is used to find the peak
+    # queue size. Planners which don't override this report a peak of 0.
+    def queue_length(self) -> int:
+        return 0
+
     # This method determines if the goal has been reached.
     # This corresponds to line 5 of the pseudocode    
     def has_goal_been_reached(self, cell) -> bool:
@@ -159,6 +217,65 @@ class PlannerBase(object):
     # index from 0 and refer to the cell number.
     def plan(self, start_coords: Tuple[int, int], goal_coords: Tuple[int, int]) -> bool:
 
+        # Start measuring the memory if required
+        if self._track_memory is True:
+            started_tracing = tracemalloc.is_tracing() is False
+            if started_tracing is True:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline_memory = tracemalloc.get_traced_memory()[0]
+
+        # Stop measuring the memory even if the search fails
+        try:
+            # The first step sets up the search
+            search = self.plan_iter(start_coords, goal_coords)
+            next(search)
+
+            # If required, set up the grid drawer and show the initial state
+            if (self._show_graphics == True):
+                if (self._search_grid_drawer is None):
+                    self._search_grid_drawer = \
+                        SearchGridDrawer(self._search_grid, \
+                                         self._maximum_grid_drawer_window_height_in_pixels)
+                else:
+                    self._search_grid_drawer.reset()
+                self.draw_current_state()
+                #self._search_grid_drawer.wait_for_key_press()
+
+            # Run the search, drawing the update after each cell if required
+            for cell in search:
+                if (self._show_graphics_each_iteration == True):
+                    self.draw_current_state()
+
+            # Draw the final results if required
+            self.draw_current_state()
+
+        finally:
+            if self._track_memory is True:
+                self._planning_stats.peak_memory_in_bytes = tracemalloc.get_traced_memory()[1] - baseline_memory
+                if started_tracing is True:
+                    tracemalloc.stop()
+
+        if self._verbose is True:
+            if (self._goal_reached == True):
+                print (f'Reached the goal after visiting {self.number_of_cells_visited} cells')
+            else:
+                print (f'Could not reach the goal after visiting {self.number_of_cells_visited} cells')
+            
+        return self._goal_reached
+
+    # The search as a generator, which can be resumed step by step. It
+    # yields None once the search has been set up, and then the last cell
+    # expanded after every expansions_per_step cells. When the search
+    # finishes, it returns whether the goal was reached. The caller
+    # decides when to resume it, and when to draw it; nothing is drawn here.
+    def plan_iter(self, start_coords: Tuple[int, int], goal_coords: Tuple[int, int], \
+                  expansions_per_step: int = 1):
+
+        stats = PlanningStats()
+        self._planning_stats = stats
+        segment_start_time = time.perf_counter()
+
         # Empty the queue. This is needed to make sure everything is reset
         while (self.is_queue_empty() == False):
             self.pop_cell_from_queue()
@@ -166,9 +283,10 @@ class PlannerBase(object):
         # Create the search grid from the occupancy grid and seed
         # unvisited and occupied cells.
         if (self._search_grid is None):
-            self._search_grid = SearchGrid.from_environment_map(self._environment_map)
+            self._search_grid = SearchGrid.from_environment_map(self._environment_map, \
+                                                                self._robot_radius)
         else:
-            self._search_grid.set_from_environment_map(self._environment_map)
+            self._search_grid.set_from_environment_map(self._environment_map, self._robot_radius)
 
         # Get the start cell object and label it as such. Also set its
         # path cost to 0.
@@ -180,26 +298,35 @@ class PlannerBase(object):
         self.goal = self._search_grid.cell_from_coords(goal_coords)
         self.goal.is_goal = True
 
-        # If required, set up the grid drawer and show the initial state
-        if (self._show_graphics == True):
-            if (self._search_grid_drawer is None):
-                self._search_grid_drawer = \
-                    SearchGridDrawer(self._search_grid, \
-                                     self._maximum_grid_drawer_window_height_in_pixels)
-            else:
-                self._search_grid_drawer.reset()
-            self.draw_current_state()
-            #self._search_grid_drawer.wait_for_key_press()
-
-        # Insert the start on the queue to start the process going.
-        self.mark_cell_as_visited_and_record_parent(self.start, None)
-        self.push_cell_onto_queue(self.start)
-
         # Reset the count
         self.number_of_cells_visited = 0
 
         # Indicates if we reached the goal or not
         self._goal_reached = False
+
+        # The log is only touched if there is one
+        log = self._search_event_log
+        if log is not None:
+            log.begin(self._search_grid, start_coords, goal_coords)
+
+        # The hooks are None if nothing is subscribed
+        on_expand = self._hooks.dispatcher('on_expand')
+        on_relax = self._hooks.dispatcher('on_relax')
+
+        stats.reset_time_in_seconds = time.perf_counter() - segment_start_time
+
+        yield None
+
+        segment_start_time = time.perf_counter()
+
+        # Insert the start on the queue to start the process going.
+        self.mark_cell_as_visited_and_record_parent(self.start, None)
+        self.push_cell_onto_queue(self.start)
+        stats.number_of_pushes = 1
+        stats.peak_queue_size = self.queue_length()
+
+        # The number of cells expanded since the last step
+        expansions = 0
         
         # Iterate until we have run out of live cells to try or we reached the goal
         # This corresponds to lines 3-15 of the pseudocode
@@ -214,25 +341,47 @@ class PlannerBase(object):
                     self.mark_cell_as_visited_and_record_parent(nextCell, cell)
                     self.push_cell_onto_queue(nextCell)
                     self.number_of_cells_visited = self.number_of_cells_visited + 1
+                    stats.number_of_pushes += 1
+                    if log is not None:
+                        log.record_push(nextCell)
+                elif log is None:
+                    stats.number_of_duplicate_resolutions += 1
+                    self.resolve_duplicate(nextCell, cell)
                 else:
+                    stats.number_of_duplicate_resolutions += 1
+                    old_parent = nextCell.parent
                     self.resolve_duplicate(nextCell, cell)
+                    if nextCell.parent is not old_parent:
+                        log.record_parent_change(nextCell)
+                if on_relax is not None:
+                    on_relax(self, nextCell, cell)
 
             # Now that we've checked all the actions for (self) cell,
             # mark it as dead
             self.mark_cell_as_dead(cell)
+            if log is not None:
+                log.record_expansion(cell)
+            if on_expand is not None:
+                on_expand(self, cell)
 
-            # Draw the update if required
-            if (self._show_graphics_each_iteration == True):
-                self.draw_current_state()
+            stats.number_of_expansions += 1
+            queue_length = self.queue_length()
+            if queue_length > stats.peak_queue_size:
+                stats.peak_queue_size = queue_length
 
-        # Draw the final results if required
-        self.draw_current_state()
+            # The time the caller spends between steps is not counted
+            expansions = expansions + 1
+            if (expansions == expansions_per_step):
+                expansions = 0
+                stats.search_time_in_seconds += time.perf_counter() - segment_start_time
+                yield cell
+                segment_start_time = time.perf_counter()
+
+        stats.search_time_in_seconds += time.perf_counter() - segment_start_time
+
+        if log is not None:
+            log.end(self._goal_reached)
 
-        if (self._goal_reached == True):
-            print (f'Reached the goal after visiting {self.number_of_cells_visited} cells')
-        else:
-            print (f'Could not reach the goal after visiting {self.number_of_cells_visited} cells')
-            
         return self._goal_reached
 
 
@@ -242,12 +391,16 @@ class PlannerBase(object):
     # (self) method to try to find the path from any end cell. However,
     # depending upon the planner used, the results might not be
     # valid. In (self) case, the path will probably not terminate at the
-    # start cell.
+    # start cell. The time taken, including drawing the path, is added
+    # to the statistics of the search.
     def extract_path(self, path_end_cell: SearchGridCell) -> PlannedPath:
 
+        start_time = time.perf_counter()
+
         # Construct the path object and mark if the goal was reached
         path = PlannedPath()
         path.goal_reached = self._goal_reached
+        path.stats = self._planning_stats
         
         # Initial condition - the goal cell
         path.waypoints.append(path_end_cell)
@@ -281,6 +434,7 @@ class PlannerBase(object):
         # If we didn't reach the goal, the cost is infinite
         if self._goal_reached is False:
             path.path_travel_cost = float('inf')
+            self._record_extract_time(start_time)
             return path
             
         # Now go forwards through the path and construct the cost. We could do it
@@ -296,20 +450,101 @@ class PlannerBase(object):
                 path_cost = path_cost + math.sqrt(dX * dX + dY * dY)               
 
         path.path_travel_cost = path_cost
+        self._record_extract_time(start_time)
 
         # Return the path
         return path
 
+    def _record_extract_time(self, start_time):
+        if self._planning_stats is not None:
+            self._planning_stats.extract_time_in_seconds += time.perf_counter() - start_time
+
     # Extract the path between the start and goal.
     def extract_path_to_goal(self) -> PlannedPath:
         path = self.extract_path(self.goal)
         return path
+
+    # Plan a path from the start to the goal in a search context and
+    # return it. This does not change the state of this planner.
+    def plan_path(self, start_coords: Tuple[int, int], goal_coords: Tuple[int, int]) -> PlannedPath:
+        search_context = self.create_search_context()
+        try:
+            search_context.plan(start_coords, goal_coords)
+            return search_context.extract_path_to_goal()
+        finally:
+            self.release_search_context(search_context)
+
+    # Get a planner to hold the state of a single search. An idle context
+    # is reused if there is one; otherwise a new one is made, which relies
+    # on every planner being constructible from just the map. The objects
+    # the new planner makes for itself, such as its queue, stay its own.
+    # Every other attribute of this planner - its settings, hooks and
+    # search event log - is copied into the context each time, so the
+    # context always has the current settings. Because the log is shared,
+    # only log searches which don't run at the same time. The graphics are
+    # always disabled.
+    def create_search_context(self):
+        with self._search_context_lock:
+            search_context = self._idle_search_contexts.pop() if self._idle_search_contexts else None
+
+        if search_context is None:
+            search_context = self.__class__(self._environment_map)
+            search_context._search_context_owned_attributes = \
+                frozenset(name for name, value in vars(search_context).items() \
+                          if _is_search_object(value)) - {'_environment_map', '_hooks'}
+
+        for name, value in vars(self).items():
+            if (name not in _SEARCH_STATE_ATTRIBUTES) and \
+                (name not in search_context._search_context_owned_attributes):
+                setattr(search_context, name, value)
+
+        search_context._show_graphics = False
+        search_context._show_graphics_each_iteration = False
+        return search_context
+
+    # Return a search context from create_search_context() so that it can
+    # be reused. The context must not be used afterwards.
+    def release_search_context(self, search_context):
+        with self._search_context_lock:
+            self._idle_search_contexts.append(search_context)
     
     # Draw the output and sleep for the pause time.
     def draw_current_state(self):
         if (self._show_graphics == True):
+            start_time = time.perf_counter()
             self._search_grid_drawer.update()
             time.sleep(self._pause_time_in_seconds)
+            if self._planning_stats is not None:
+                self._planning_stats.draw_time_in_seconds += time.perf_counter() - start_time
+
+    # The statistics of the last search
+    def planning_stats(self) -> Optional[PlanningStats]:
+        return self._planning_stats
+
+    # Measure the peak memory used by each search with tracemalloc
+    def set_track_memory(self, track_memory: bool):
+        self._track_memory = track_memory
+
+    # Print the result of each search
+    def set_verbose(self, verbose: bool):
+        self._verbose = verbose
+
+    # Subscribe a callback to one of the search events, on_expand or
+    # on_relax. The search contexts created by plan_path() share the
+    # hooks, so the callbacks can be called from several threads.
+    def add_hook(self, event: str, callback):
+        return self._hooks.add_hook(event, callback)
+
+    def remove_hook(self, event: str, callback):
+        self._hooks.remove_hook(event, callback)
+
+    # Set the radius of the robot's footprint. This selects the inflated
+    # obstruction mask used to build the search grid.
+    def set_robot_radius(self, robot_radius: float):
+        self._robot_radius = robot_radius
+
+    def robot_radius(self) -> float:
+        return self._robot_radius
 
     # Set the pause time
     def set_pause_time(self, pause_time_in_seconds: float):
@@ -319,6 +554,14 @@ class PlannerBase(object):
     def set_path_pause_time(self, path_pause_time_in_seconds: float):
         self._path_pause_time_in_seconds = path_pause_time_in_seconds
 
+    # Record the events of each search in a SearchEventLog, or stop
+    # recording if the log is None
+    def set_search_event_log(self, search_event_log):
+        self._search_event_log = search_event_log
+
+    def search_event_log(self):
+        return self._search_event_log
+
     def show_parent_arrows(self, draw_parent_arrows):
         self._draw_parent_arrows = draw_parent_arrows
 
@@ -329,6 +572,9 @@ class PlannerBase(object):
     def show_graphics(self, show_graphics: bool):
         self._show_graphics = show_graphics
 
+    def is_showing_graphics(self) -> bool:
+        return self._show_graphics
+
     def search_grid_drawer(self):
         return self._search_grid_drawer
 
@@ -338,3 +584,9 @@ class PlannerBase(object):
     def wait_for_key_press(self):
         self._search_grid_drawer.wait_for_key_press()
         
+
+# Is the value an object a planner makes for each search, such as a queue,
+# rather than a setting?
+def _is_search_object(value):
+    return (value is not None) and \
+        (isinstance(value, (bool, int, float, str, tuple, frozenset, Enum)) is False)
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from .cell_grid import CellGrid
+from .compiled_map import CompiledMap
+from .planned_path import PlannedPath
+
+# This class is an asyncio front end to the planners. Many robot
+# controllers in the same process can call
+#
+#     path = await planning_service.plan(start_coords, goal_coords)
+#
+# concurrently. The searches run on a bounded pool of worker threads, using
+# a single planner and a CompiledMap which are shared between them. The map
+# is compiled again whenever its version changes.
+#
+# Identical requests - same start, goal, map version and robot radius -
+# which arrive while a search for them is still running are coalesced: they
+# all wait for the same search, and receive the same PlannedPath object,
+# which must therefore be treated as read only.
+#
+# Each request can have a timeout. If a request times out or is cancelled,
+# only that request is affected. The search itself is cancelled once no
+# request is waiting for it. If it has already started, it is stepped
+# through with plan_iter() and stops at the next check.
+
+# The number of cells expanded between checks for cancellation
+_EXPANSIONS_BETWEEN_CANCELLATION_CHECKS = 256
+
+# A search which is queued or running, and the number of requests waiting for it
+class _InFlightSearch(object):
+
+    def __init__(self, future, cancelled):
+        self.future = future
+        self.number_of_waiters = 0
+
+        # Set to stop the search in the worker thread
+        self.cancelled = cancelled
+
+class PlanningService(object):
+
+    def __init__(self, environment_map: CellGrid, planner_class, max_workers: int = 4, \
+                 robot_radius: float = 0, timeout_in_seconds: Optional[float] = None):
+        self._environment_map = environment_map
+        self._planner_class = planner_class
+        self._robot_radius = robot_radius
+
+        # The default timeout for each request. None means wait forever.
+        self._timeout_in_seconds = timeout_in_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers = max_workers, \
+                                            thread_name_prefix = 'planning_service')
+
+        # The planner built on the current compiled map
+        self._planner = None
+        self._planner_map_version = None
+
+        # The searches in flight, keyed on the request
+        self._in_flight_searches = {}
+
+        # Statistics
+        self.number_of_requests = 0
+        self.number_of_searches = 0
+        self.number_of_coalesced_requests = 0
+
+    # Plan a path from the start to the goal. Raises asyncio.TimeoutError if
+    # the path isn't found within the timeout.
+    async def plan(self, start_coords: Tuple[int, int], goal_coords: Tuple[int, int], \
+                   timeout_in_seconds: Optional[float] = None) -> PlannedPath:
+
+        if timeout_in_seconds is None:
+            timeout_in_seconds = self._timeout_in_seconds
+
+        self.number_of_requests += 1
+
+        planner = self._current_planner()
+        key = (tuple(start_coords), tuple(goal_coords), self._planner_map_version, self._robot_radius)
+
+        search = self._in_flight_searches.get(key)
+        if search is None:
+            cancelled = threading.Event()
+            future = asyncio.get_running_loop().run_in_executor(self._executor, _run_search, planner, \
+                                                                 start_coords, goal_coords, cancelled)
+            search = _InFlightSearch(future, cancelled)
+            self._in_flight_searches[key] = search
+            future.add_done_callback(lambda _ : self._forget_search(key, search))
+            self.number_of_searches += 1
+        else:
+            self.number_of_coalesced_requests += 1
+
+        # The search is shielded so that a request which times out or is
+        # cancelled doesn't cancel it for the other requests
+        search.number_of_waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(search.future), timeout_in_seconds)
+        finally:
+            search.number_of_waiters -= 1
+            if (search.number_of_waiters == 0) and (search.future.done() is False):
+                search.future.cancel()
+                search.cancelled.set()
+                self._forget_search(key, search)
+
+    # Shut down the worker threads. The searches which are running are
+    # stopped at their next check, and this waits for them to stop.
+    def close(self):
+        self._cancel_in_flight_searches()
+        self._executor.shutdown(wait = True, cancel_futures = True)
+
+    async def __aenter__(self):
+        return self
+
+    # The searches are cancelled here, on the event loop, and the wait for
+    # the worker threads runs in the default executor so that it doesn't
+    # block the event loop
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._cancel_in_flight_searches()
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    # Get the planner, compiling the map again if it has changed
+    def _current_planner(self):
+        version = self._environment_map.version()
+        if (self._planner is None) or (self._planner_map_version != version):
+            compiled_map = CompiledMap(self._environment_map, self._robot_radius)
+            self._planner = self._planner_class(compiled_map)
+            self._planner.show_graphics(False)
+            self._planner_map_version = version
+        return self._planner
+
+    def _cancel_in_flight_searches(self):
+        for search in list(self._in_flight_searches.values()):
+            search.cancelled.set()
+
+    def _forget_search(self, key, search):
+        if self._in_flight_searches.get(key) is search:
+            del self._in_flight_searches[key]
+
+# Plan a path in a new search context, stopping early if the search is
+# cancelled. This runs in a worker thread.
+def _run_search(planner, start_coords, goal_coords, cancelled):
+    search_context = planner.create_search_context()
+    try:
+        for cell in search_context.plan_iter(start_coords, goal_coords, \
+                                             _EXPANSIONS_BETWEEN_CANCELLATION_CHECKS):
+            if cancelled.is_set():
+                return None
+        return search_context.extract_path_to_goal()
+    finally:
+        planner.release_search_context(search_context)
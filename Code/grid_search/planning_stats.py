@@ -0,0 +1,40 @@
+# This class is a plain old data structure (=no hidden fields)
+# which stores statistics about a single search
+
+class PlanningStats(object):
+
+    def __init__(self):
+
+        # The number of cells taken off the queue and expanded
+        self.number_of_expansions = 0
+
+        # The number of cells pushed onto the queue when they were first
+        # visited, including the start
+        self.number_of_pushes = 0
+
+        # The number of times a neighbour had already been visited
+        self.number_of_duplicate_resolutions = 0
+
+        # The largest number of entries on the queue
+        self.peak_queue_size = 0
+
+        # Time spent resetting the search grid and queue, searching,
+        # extracting the path and drawing the graphics (including the
+        # pauses)
+        self.reset_time_in_seconds = 0
+        self.search_time_in_seconds = 0
+        self.extract_time_in_seconds = 0
+        self.draw_time_in_seconds = 0
+
+        # The peak memory allocated during the search. This is None unless
+        # memory tracking is enabled on the planner.
+        self.peak_memory_in_bytes = None
+
+    def __repr__(self):
+        return f'PlanningStats(expansions={self.number_of_expansions}, ' \
+            f'pushes={self.number_of_pushes}, ' \
+            f'duplicate_resolutions={self.number_of_duplicate_resolutions}, ' \
+            f'peak_queue_size={self.peak_queue_size}, ' \
+            f'reset={self.reset_time_in_seconds:.6f}s, search={self.search_time_in_seconds:.6f}s, ' \
+            f'extract={self.extract_time_in_seconds:.6f}s, draw={self.draw_time_in_seconds:.6f}s, ' \
+            f'peak_memory={self.peak_memory_in_bytes})'
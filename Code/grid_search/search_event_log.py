@@ -0,0 +1,270 @@
+import struct
+import sys
+import time
+from array import array
+from enum import Enum
+
+from .search_grid import SearchGrid, SearchGridCell, SearchGridCellLabel
+from .search_grid_drawer import SearchGridDrawer
+
+# Drawing the search grid after every expansion is very slow. Instead, the
+# planner can record what happens during the search in a SearchEventLog,
+# while it runs at full speed:
+#
+#     log = SearchEventLog()
+#     planner.set_search_event_log(log)
+#     planner.plan(start, goal)
+#     log.save('search.sel')
+#
+# The search can then be played back afterwards with a SearchEventReplayer,
+# which animates it or exports the frames as images.
+#
+# Each event is stored as a type, the index of the cell (x * height + y)
+# and the index of its parent, in three packed arrays.
+
+class SearchEventType(Enum):
+    PUSH = 0
+    EXPAND = 1
+    PARENT_CHANGE = 2
+
+_PUSH = SearchEventType.PUSH.value
+_EXPAND = SearchEventType.EXPAND.value
+_PARENT_CHANGE = SearchEventType.PARENT_CHANGE.value
+
+# Magic number, width, height, start x and y, goal x and y, goal reached
+# (-1 if the search has not finished), and the number of events
+_HEADER = struct.Struct('<4siiiiiiii')
+_MAGIC = b'SEL1'
+
+class SearchEventLog(object):
+
+    def __init__(self):
+        self._width = 0
+        self._height = 0
+        self._start_coords = None
+        self._goal_coords = None
+        self._goal_reached = None
+
+        # Obstructions in the search grid, one byte per cell
+        self._obstructions = bytes()
+
+        self._types = array('b')
+        self._cells = array('i')
+        self._parents = array('i')
+
+    # Clear the log and record the initial state of the search
+    def begin(self, search_grid, start_coords, goal_coords):
+        self._width = search_grid.width()
+        self._height = search_grid.height()
+        self._start_coords = tuple(start_coords)
+        self._goal_coords = tuple(goal_coords)
+        self._goal_reached = None
+
+        self._obstructions = bytes(bool(search_grid.cell(x, y).is_obstruction()) \
+                                   for x in range(self._width) for y in range(self._height))
+
+        self._types = array('b')
+        self._cells = array('i')
+        self._parents = array('i')
+
+    # Record the end of the search
+    def end(self, goal_reached):
+        self._goal_reached = goal_reached
+
+    # A cell was visited for the first time and pushed onto the queue
+    def record_push(self, cell: SearchGridCell):
+        self._record(_PUSH, cell, cell.parent)
+
+    # A cell was taken off the queue and all its neighbours checked
+    def record_expansion(self, cell: SearchGridCell):
+        self._record(_EXPAND, cell, None)
+
+    # A cell which had already been visited got a new parent
+    def record_parent_change(self, cell: SearchGridCell):
+        self._record(_PARENT_CHANGE, cell, cell.parent)
+
+    def _record(self, event_type, cell, parent):
+        coords = cell.coords()
+        self._types.append(event_type)
+        self._cells.append(coords[0] * self._height + coords[1])
+        if parent is None:
+            self._parents.append(-1)
+        else:
+            parent_coords = parent.coords()
+            self._parents.append(parent_coords[0] * self._height + parent_coords[1])
+
+    def __len__(self):
+        return len(self._types)
+
+    # Get an event as (type, cell coords, parent coords). The parent
+    # coords are None if there is no parent.
+    def event(self, index):
+        cell_index = self._cells[index]
+        parent_index = self._parents[index]
+        parent_coords = None if parent_index < 0 else divmod(parent_index, self._height)
+        return SearchEventType(self._types[index]), divmod(cell_index, self._height), parent_coords
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def start_coords(self):
+        return self._start_coords
+
+    def goal_coords(self):
+        return self._goal_coords
+
+    # True or False, or None if the search did not finish
+    def goal_reached(self):
+        return self._goal_reached
+
+    def is_obstruction(self, x, y):
+        return self._obstructions[x * self._height + y] == 1
+
+    # Size of the events in bytes
+    def number_of_bytes(self):
+        return len(self._types) * self._types.itemsize + \
+            len(self._cells) * self._cells.itemsize + len(self._parents) * self._parents.itemsize
+
+    # Save the log in a binary file
+    def save(self, filename):
+        goal_reached = -1 if self._goal_reached is None else int(self._goal_reached)
+        with open(filename, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, self._width, self._height, \
+                                    self._start_coords[0], self._start_coords[1], \
+                                    self._goal_coords[0], self._goal_coords[1], \
+                                    goal_reached, len(self._types)))
+            file.write(self._obstructions)
+            for events in (self._types, self._cells, self._parents):
+                _little_endian(events).tofile(file)
+
+    # Load a log saved with save()
+    @classmethod
+    def load(cls, filename):
+        log = cls()
+        with open(filename, 'rb') as file:
+            magic, log._width, log._height, start_x, start_y, goal_x, goal_y, goal_reached, \
+                number_of_events = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f'{filename} is not a search event log')
+            log._start_coords = (start_x, start_y)
+            log._goal_coords = (goal_x, goal_y)
+            log._goal_reached = None if goal_reached < 0 else bool(goal_reached)
+            log._obstructions = file.read(log._width * log._height)
+            for events in (log._types, log._cells, log._parents):
+                events.fromfile(file, number_of_events)
+                events[:] = _little_endian(events)
+        return log
+
+# The files are little endian; swap the bytes on big endian hosts
+def _little_endian(events):
+    if sys.byteorder == 'big':
+        events = array(events.typecode, events)
+        events.byteswap()
+    return events
+
+# This class plays back a search event log. It rebuilds the search grid
+# from the log, applying the events in order, and draws it with a
+# SearchGridDrawer.
+
+class SearchEventReplayer(object):
+
+    def __init__(self, search_event_log: SearchEventLog, maximum_grid_drawer_window_height_in_pixels = 800):
+        self._log = search_event_log
+        self._maximum_grid_drawer_window_height_in_pixels = maximum_grid_drawer_window_height_in_pixels
+        self._search_grid_drawer = None
+        self.reset()
+
+    # Go back to the state before the first event
+    def reset(self):
+        log = self._log
+        self._search_grid = SearchGrid(log.width(), log.height(), 1)
+        self._search_grid._set_search_grid([[SearchGridCell((x, y), log.is_obstruction(x, y)) \
+                                             for y in range(log.height())] for x in range(log.width())])
+
+        start = self._search_grid.cell_from_coords(log.start_coords())
+        start.is_start = True
+        start.set_label(SearchGridCellLabel.ALIVE)
+        self._search_grid.cell_from_coords(log.goal_coords()).is_goal = True
+
+        self._next_event = 0
+
+        if self._search_grid_drawer is not None:
+            self._search_grid_drawer.reset()
+            self._search_grid_drawer._grid = self._search_grid
+
+    def search_grid(self):
+        return self._search_grid
+
+    def search_grid_drawer(self):
+        return self._search_grid_drawer
+
+    def is_finished(self):
+        return self._next_event == len(self._log)
+
+    # Apply up to number_of_events events. Returns the number applied.
+    def step(self, number_of_events = 1):
+        last_event = min(self._next_event + number_of_events, len(self._log))
+        height = self._log.height()
+        grid = self._search_grid
+        types = self._log._types
+        cells = self._log._cells
+        parents = self._log._parents
+
+        for index in range(self._next_event, last_event):
+            x, y = divmod(cells[index], height)
+            cell = grid.cell(x, y)
+            if types[index] == _EXPAND:
+                cell.set_label(SearchGridCellLabel.DEAD)
+                continue
+            if types[index] == _PUSH:
+                cell.set_label(SearchGridCellLabel.ALIVE)
+            parent_x, parent_y = divmod(parents[index], height)
+            cell.set_parent(grid.cell(parent_x, parent_y))
+
+        number_applied = last_event - self._next_event
+        self._next_event = last_event
+
+        # Once the search is over, show the path
+        if self.is_finished() and (self._log.goal_reached() is True):
+            self._mark_path()
+
+        return number_applied
+
+    # Show the search, drawing after every events_per_frame events
+    def animate(self, events_per_frame = 1, pause_time_in_seconds = 0.05):
+        self._create_drawer()
+        self._search_grid_drawer.update()
+        while self.is_finished() is False:
+            self.step(events_per_frame)
+            self._search_grid_drawer.update()
+            time.sleep(pause_time_in_seconds)
+
+    # Save a screenshot after every events_per_frame events. The filename
+    # pattern is formatted with the frame number, for example
+    # 'frame_{:05d}.png'. Returns the number of frames saved.
+    def export_frames(self, filename_pattern, events_per_frame = 1):
+        self._create_drawer()
+        self._search_grid_drawer.update()
+        self._search_grid_drawer.save_screenshot(filename_pattern.format(0))
+        frame = 1
+        while self.is_finished() is False:
+            self.step(events_per_frame)
+            self._search_grid_drawer.update()
+            self._search_grid_drawer.save_screenshot(filename_pattern.format(frame))
+            frame += 1
+        return frame
+
+    def _create_drawer(self):
+        if self._search_grid_drawer is None:
+            self._search_grid_drawer = SearchGridDrawer(self._search_grid, \
+                                                        self._maximum_grid_drawer_window_height_in_pixels)
+
+    def _mark_path(self):
+        cell = self._search_grid.cell_from_coords(self._log.goal_coords())
+        while cell is not None:
+            if (cell.is_start is False) and (cell.is_goal is False):
+                cell.is_on_path = True
+            cell = cell.parent
@@ -79,18 +79,19 @@ class SearchGrid(CellGrid):
 
         # Construct the class using an occupancy grid object
     @classmethod
-    def from_environment_map(cls, environment_map):
+    def from_environment_map(cls, environment_map, robot_radius = 0):
 
         (self) = cls(environment_map.width(), environment_map.height(), environment_map.resolution())
 
         # Populate the search grid from the occupancy grid
-        self.set_from_environment_map(environment_map)
+        self.set_from_environment_map(environment_map, robot_radius)
         
         return self
 
-    # Reset the state of the search grid to the value of the occupancy grid
-    def set_from_environment_map(self, environment_map):
-        environment_map.populate_search_grid(self)        
+    # Reset the state of the search grid to the value of the occupancy grid. If
+    # the robot radius is set, obstructions are inflated by the robot's footprint.
+    def set_from_environment_map(self, environment_map, robot_radius = 0):
+        environment_map.populate_search_grid(self, robot_radius)        
 
     def cell(self, x, y):
         return self._grid[x][y]
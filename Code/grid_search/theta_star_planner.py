@@ -0,0 +1,108 @@
+import heapq
+import math
+from typing import Tuple
+
+from .line_of_sight import line_cost
+from .occupancy_grid import OccupancyGrid
+from .planner_base import PlannerBase
+from .search_grid import SearchGridCell, SearchGridCellLabel
+
+# This class implements the Theta* any-angle planner. It is A* on the
+# 8-connected grid, except that when a cell is reached, the planner checks
+# whether there is a straight line from the grandparent to the cell. If
+# there is, and it is cheaper, the grandparent becomes the parent. As a
+# result, the parents form straight segments which are not restricted to
+# multiples of 45 degrees, and the path has far fewer waypoints.
+
+# The line of sight checks trace the segment over the obstruction and
+# traversability cost arrays of the map, using the same inflated mask
+# that the search grid is built from.
+
+class ThetaStarPlanner(PlannerBase):
+
+    def __init__(self, occupancy_grid: OccupancyGrid):
+        PlannerBase.__init__(self, occupancy_grid)
+        self._priority_queue = []
+
+        # Count of the pushes, used to break ties between cells with the
+        # same priority in first-in-first-out order
+        self._push_count = 0
+
+        # The cheapest traversability cost in the map, which scales the
+        # heuristic. It is found once for each search.
+        self._minimum_traversability_cost = None
+
+    # Find the cheapest traversability cost when the search is set up, so
+    # that the map is not scanned on every push
+    def plan_iter(self, start_coords: Tuple[int, int], goal_coords: Tuple[int, int], \
+                  expansions_per_step: int = 1):
+        self._minimum_traversability_cost = self._environment_map.traversability_cost_array().min()
+        return (yield from PlannerBase.plan_iter(self, start_coords, goal_coords, expansions_per_step))
+
+    # The priority is the path cost plus the straight line distance to the
+    # goal, scaled by the cheapest traversability cost so it is admissible
+    def push_cell_onto_queue(self, cell: SearchGridCell):
+        cell_coords = cell.coords()
+        goal_coords = self.goal.coords()
+
+        dX = cell_coords[0] - goal_coords[0]
+        dY = cell_coords[1] - goal_coords[1]
+        heuristic = math.sqrt(dX * dX + dY * dY) * self._minimum_traversability_cost
+
+        heapq.heappush(self._priority_queue, (cell.path_cost + heuristic, self._push_count, cell))
+        self._push_count += 1
+
+    # A cell is pushed again each time its cost improves. The old entries
+    # are discarded here once the cell has been expanded.
+    def is_queue_empty(self) -> bool:
+        while self._priority_queue and \
+            (self._priority_queue[0][2].label() == SearchGridCellLabel.DEAD):
+            heapq.heappop(self._priority_queue)
+        return not self._priority_queue
+
+    def pop_cell_from_queue(self) -> SearchGridCell:
+        return heapq.heappop(self._priority_queue)[2]
+
+    # This includes the stale entries which have not been purged yet
+    def queue_length(self) -> int:
+        return len(self._priority_queue)
+
+    def mark_cell_as_visited_and_record_parent(self, cell, parent_cell):
+        cell.set_label(SearchGridCellLabel.ALIVE)
+
+        # The start cell has no parent
+        if parent_cell is None:
+            cell.set_parent(None)
+            return
+
+        best_parent, path_cost = self._best_parent(cell, parent_cell)
+        cell.set_parent(best_parent)
+        cell.path_cost = path_cost
+
+    def resolve_duplicate(self, cell: SearchGridCell, parent_cell: SearchGridCell):
+        if cell.label() == SearchGridCellLabel.DEAD:
+            return
+
+        best_parent, path_cost = self._best_parent(cell, parent_cell)
+        if path_cost < cell.path_cost:
+            cell.path_cost = path_cost
+            cell.set_parent(best_parent)
+            self.push_cell_onto_queue(cell)
+
+    # Work out whether the cell should be reached from the cell being
+    # expanded, or directly from that cell's parent.
+    def _best_parent(self, cell, parent_cell):
+        best_parent = parent_cell
+        path_cost = parent_cell.path_cost + self.compute_l_stage_additive_cost(parent_cell, cell)
+
+        grandparent_cell = parent_cell.parent
+        if grandparent_cell is not None:
+            blocked = self._environment_map.inflated_obstruction_mask(self._robot_radius)
+            costs = self._environment_map.traversability_cost_array()
+            shortcut_cost = grandparent_cell.path_cost + \
+                line_cost(blocked, costs, grandparent_cell.coords(), cell.coords())
+            if shortcut_cost <= path_cost:
+                best_parent = grandparent_cell
+                path_cost = shortcut_cost
+
+        return best_parent, path_cost
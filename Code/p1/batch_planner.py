@@ -0,0 +1,110 @@
+# This module plans many independent start / goal queries on the same map
+# in parallel. The queries are fanned out over a pool of worker processes.
+# The map is sent to each worker once, when the worker starts, and each
+# worker builds one planner which it reuses for all its queries. The
+# results are returned in the same order as the queries.
+
+# By default the map is not pickled at all. Instead its arrays are
+# published in shared memory, and the workers receive a small descriptor
+# which they use to attach to them.
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from common.shared_airport_map import SharedAirportMap, SharedAirportMapDescriptor, \
+    SharedAirportMapView
+from grid_search.planned_path import PlannedPath
+
+from .high_level_environment import PlannerType, create_planner
+
+# The planner used by this worker process
+_worker_planner = None
+
+# The result of planning a single query. The path only contains the
+# waypoint coordinates so that it is cheap to send back from the worker.
+class BatchPlanResult(object):
+
+    def __init__(self, start_coords, goal_coords, path, planning_time_in_seconds):
+        self.start_coords = start_coords
+        self.goal_coords = goal_coords
+        self.path = path
+        self.planning_time_in_seconds = planning_time_in_seconds
+
+        # The process which planned the query
+        self.worker_pid = os.getpid()
+
+# Plan a list of (start_coords, goal_coords) queries. If workers is None,
+# one worker is used per CPU. If workers is 1, the queries are planned in
+# this process with a planner of its own, which is dropped afterwards. Returns a list of BatchPlanResult objects in the same order
+# as the queries.
+def plan_batch(airport_map, queries, planner_type = PlannerType.BREADTH_FIRST, \
+               workers = None, robot_radius = 0, use_shared_memory = True):
+
+    queries = list(queries)
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    workers = max(1, min(workers, len(queries)))
+
+    if workers == 1:
+        planner = _create_batch_planner(airport_map, planner_type, robot_radius)
+        return [_plan_query_with_planner(planner, query) for query in queries]
+
+    # Hand the queries out in chunks to cut the communication overhead, but
+    # keep enough chunks that the load is balanced between the workers
+    chunk_size = max(1, len(queries) // (4 * workers))
+
+    if use_shared_memory is False:
+        with ProcessPoolExecutor(max_workers = workers, initializer = _initialize_worker, \
+                                 initargs = (airport_map, planner_type, robot_radius)) as executor:
+            return list(executor.map(_plan_query, queries, chunksize = chunk_size))
+
+    # The shared memory is released once all the workers have shut down
+    with SharedAirportMap(airport_map) as shared_map, \
+        ProcessPoolExecutor(max_workers = workers, initializer = _initialize_worker, \
+                            initargs = (shared_map.descriptor(), planner_type, robot_radius)) as executor:
+        return list(executor.map(_plan_query, queries, chunksize = chunk_size))
+
+# Build the planner for this worker. The map is either the map itself, or
+# the descriptor of a map in shared memory.
+def _initialize_worker(airport_map, planner_type, robot_radius):
+    global _worker_planner
+    if isinstance(airport_map, SharedAirportMapDescriptor):
+        airport_map = SharedAirportMapView.attach(airport_map)
+    _worker_planner = _create_batch_planner(airport_map, planner_type, robot_radius)
+
+def _create_batch_planner(airport_map, planner_type, robot_radius):
+    planner = create_planner(planner_type, airport_map)
+    planner.show_graphics(False)
+    planner.set_robot_radius(robot_radius)
+    return planner
+
+# Plan a single query with the worker's planner
+def _plan_query(query):
+    return _plan_query_with_planner(_worker_planner, query)
+
+def _plan_query_with_planner(planner, query):
+    start_coords, goal_coords = query
+
+    start_time = time.perf_counter()
+    planner.plan(start_coords, goal_coords)
+    path = planner.extract_path_to_goal()
+    planning_time_in_seconds = time.perf_counter() - start_time
+
+    return BatchPlanResult(start_coords, goal_coords, _compact_path(path), planning_time_in_seconds)
+
+# Copy the path, replacing the waypoint cells with their coordinates
+def _compact_path(path):
+    compact_path = PlannedPath()
+    compact_path.goal_reached = path.goal_reached
+    compact_path.coordinates = np.array([waypoint.coords() for waypoint in path.waypoints], \
+                                        dtype = np.int32).reshape(-1, 2)
+    compact_path.number_of_waypoints = len(compact_path.coordinates)
+    compact_path.path_travel_cost = path.path_travel_cost
+    compact_path.number_of_cells_visited = path.number_of_cells_visited
+    compact_path.stats = path.stats
+    return compact_path
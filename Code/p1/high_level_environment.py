@@ -13,6 +13,7 @@ from grid_search.a_star_planner import AStarPlanner
 from grid_search.breadth_first_planner import BreadthFirstPlanner
 from grid_search.depth_first_planner import DepthFirstPlanner
 from grid_search.dijkstra_planner import DijkstraPlanner
+from grid_search.theta_star_planner import ThetaStarPlanner
 
 from .high_level_actions import HighLevelActionType
 
@@ -22,7 +23,28 @@ class PlannerType(Enum):
     DEPTH_FIRST = 1
     DIJKSTRA = 2
     A_STAR = 3
+    THETA_STAR = 4
 
+# The registry of planner classes, keyed on planner type. Planners are only
+# built when an environment asks for them. New planners can be added with
+# register_planner.
+_planner_classes = {}
+
+def register_planner(planner_type, planner_class):
+    _planner_classes[planner_type] = planner_class
+
+# Build a planner of the given type on the map
+def create_planner(planner_type, environment_map):
+    planner_class = _planner_classes.get(planner_type)
+    if planner_class is None:
+        raise ValueError(f'No planner is registered for {planner_type}')
+    return planner_class(environment_map)
+
+register_planner(PlannerType.BREADTH_FIRST, BreadthFirstPlanner)
+register_planner(PlannerType.DEPTH_FIRST, DepthFirstPlanner)
+register_planner(PlannerType.DIJKSTRA, DijkstraPlanner)
+register_planner(PlannerType.A_STAR, AStarPlanner)
+register_planner(PlannerType.THETA_STAR, ThetaStarPlanner)
 
 class HighLevelEnvironment(gymnasium.Env):
     '''
@@ -38,19 +60,19 @@ class HighLevelEnvironment(gymnasium.Env):
         self._airport_map = airport_map
         
         # Create the planner which will be used to simulate the robot's travel
-        planner_factory = {
-            PlannerType.BREADTH_FIRST : BreadthFirstPlanner(self._airport_map),
-            PlannerType.DEPTH_FIRST : DepthFirstPlanner(self._airport_map),
-            PlannerType.DIJKSTRA : DijkstraPlanner(self._airport_map),
-            PlannerType.A_STAR : AStarPlanner(self._airport_map),
-            }
-        self._planner = planner_factory.get(planner_type)
+        self._planner = create_planner(planner_type, self._airport_map)
 
         # Disable the graphics by default; this can be enabled again
         self._planner.show_graphics(False)
+
+        # True if the planner came from set_planner and might be shared
+        self._planner_is_shared = False
                 
         self._current_coords = None
 
+        # If true, print the result of each drive
+        self._verbose = False
+
     def reset(self):
         self._current_coords = None
         return self._current_coords
@@ -58,6 +80,15 @@ class HighLevelEnvironment(gymnasium.Env):
     def planner(self):
         return self._planner
 
+    # Use a planner which might be shared with other environments. When
+    # the graphics are off, the environments plan in separate search
+    # contexts and so they can step concurrently. The search is then not
+    # kept in the planner, so its search grid and number of cells visited
+    # are not updated by step.
+    def set_planner(self, planner):
+        self._planner = planner
+        self._planner_is_shared = True
+
     def search_grid_drawer(self):
         return self._planner.search_grid_drawer()
 
@@ -69,15 +100,27 @@ class HighLevelEnvironment(gymnasium.Env):
     
     def show_verbose_graphics(self, verbose_graphics):
         self._planner.update_graphics_each_iteration(verbose_graphics)
+
+    # Print the result of each drive and search
+    def set_verbose(self, verbose):
+        self._verbose = verbose
+        self._planner.set_verbose(verbose)
+
+    # Set the radius of the robot's footprint used when planning
+    def set_robot_radius(self, robot_radius):
+        self._planner.set_robot_radius(robot_radius)
     
     def step(self, action):        
         # If the action is to teleport the robot to a new location,
         # do so instantly at no cost. If the robot  can't be 
         # transported to the new cell, return a reward of -infinity
-        # and leave the robot as-is.
+        # and leave the robot as-is. Cells which are too close to an
+        # obstruction for the robot's footprint are blocked, as they are
+        # for the planner.
         if action[0] == HighLevelActionType.TELEPORT_ROBOT_TO_NEW_POSITION:
             new_coords = action[1]
-            if self._airport_map.is_obstruction(new_coords[0], new_coords[1]):
+            blocked = self._airport_map.inflated_obstruction_mask(self._planner.robot_radius())
+            if blocked[new_coords[0], new_coords[1]]:
                 return self._current_coords, -float("inf"), False, False
             else:
                 self._current_coords = action[1]
@@ -90,13 +133,22 @@ class HighLevelEnvironment(gymnasium.Env):
         # If the goal can't be reached, the reward is minus infinity
         if action[0] == HighLevelActionType.DRIVE_ROBOT_TO_NEW_POSITION:
             goal_coords = action[1]
-            self._planner.plan(self._current_coords, goal_coords)
-            plan = self._planner.extract_path_to_goal()
-            print(f'plan.path_travel_cost={plan.path_travel_cost}')
-            print(f'plan.goal_reached={plan.goal_reached}')
+            plan = self._plan_path(goal_coords)
+            if self._verbose is True:
+                print(f'plan.path_travel_cost={plan.path_travel_cost}')
+                print(f'plan.goal_reached={plan.goal_reached}')
             if plan.goal_reached is True:
                 self._current_coords = goal_coords
                 return self._current_coords, -plan.path_travel_cost, False, plan
             else:
                 return self._current_coords, -float("inf"), False, plan
-            
+
+    # The search is kept in the planner, so it can be drawn and inspected
+    # after the step. Only a shared planner with the graphics off plans in
+    # a separate search context.
+    def _plan_path(self, goal_coords):
+        if (self._planner_is_shared is True) and (self._planner.is_showing_graphics() is False):
+            return self._planner.plan_path(self._current_coords, goal_coords)
+
+        self._planner.plan(self._current_coords, goal_coords)
+        return self._planner.extract_path_to_goal()
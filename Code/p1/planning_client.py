@@ -0,0 +1,91 @@
+# This module is the client library for the planning server in
+# planning_server.py. PlanningClient mirrors HighLevelEnvironment: it keeps
+# track of the robot's position and its step() method accepts the same
+# actions and returns the same values. The planning is done by the server,
+# and the path returned in the info is a PlannedPath holding the waypoint
+# coordinates.
+
+import itertools
+import json
+import socket
+
+import numpy as np
+
+from grid_search.planned_path import PlannedPath
+
+from .high_level_actions import HighLevelActionType
+from .high_level_environment import PlannerType
+
+class PlanningClient(object):
+
+    def __init__(self, socket_path, map_name, planner_type = PlannerType.DEPTH_FIRST, robot_radius = 0):
+        self._map_name = map_name
+        self._planner_type = planner_type
+        self._robot_radius = robot_radius
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._reader = self._socket.makefile('rb')
+        self._request_ids = itertools.count()
+
+        self._current_coords = None
+
+    def reset(self):
+        self._current_coords = None
+        return self._current_coords
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # The same as HighLevelEnvironment.step
+    def step(self, action):
+        if action[0] == HighLevelActionType.TELEPORT_ROBOT_TO_NEW_POSITION:
+            new_coords = action[1]
+            response = self._request({'op': 'is_obstruction', 'robot_radius': self._robot_radius, \
+                                      'coords': list(new_coords)})
+            if response['is_obstruction'] is True:
+                return self._current_coords, -float("inf"), False, False
+            else:
+                self._current_coords = new_coords
+                return self._current_coords, 0, False, True
+
+        if action[0] == HighLevelActionType.DRIVE_ROBOT_TO_NEW_POSITION:
+            goal_coords = action[1]
+            plan = self.plan_path(self._current_coords, goal_coords)
+            if plan.goal_reached is True:
+                self._current_coords = goal_coords
+                return self._current_coords, -plan.path_travel_cost, False, plan
+            else:
+                return self._current_coords, -float("inf"), False, plan
+
+    # Ask the server to plan a path between two cells
+    def plan_path(self, start_coords, goal_coords) -> PlannedPath:
+        response = self._request({'op': 'plan', 'planner': self._planner_type.name, \
+                                  'robot_radius': self._robot_radius, \
+                                  'start': list(start_coords), 'goal': list(goal_coords)})
+
+        path = PlannedPath()
+        path.goal_reached = response['goal_reached']
+        path.path_travel_cost = response['path_travel_cost']
+        path.number_of_cells_visited = response['number_of_cells_visited']
+        path.coordinates = np.array(response['coordinates'], dtype = np.int32).reshape(-1, 2)
+        path.number_of_waypoints = len(path.coordinates)
+        return path
+
+    # Send a request and wait for its response
+    def _request(self, request):
+        request['id'] = next(self._request_ids)
+        request['map'] = self._map_name
+        self._socket.sendall(json.dumps(request).encode() + b'\n')
+
+        response = json.loads(self._reader.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+# This module implements a planning server which runs as a separate
+# process on the same host as the robots. It loads the maps once when it
+# starts, and keeps a planner on a compiled copy of each map, together with
+# a cache of recent results, warm for as long as it runs. Clients connect
+# over a Unix socket; see planning_client.py.
+#
+# The protocol is one JSON object per line. Each request has an "id",
+# which is echoed in the response, and an "op":
+#
+#   {"id": 1, "op": "plan", "map": "full_scenario", "planner": "DIJKSTRA",
+#    "robot_radius": 0, "start": [0, 0], "goal": [2, 33]}
+#   -> {"id": 1, "goal_reached": true, "path_travel_cost": 70.5,
+#       "number_of_cells_visited": 1720, "coordinates": [[0, 0], ...]}
+#
+#   {"id": 2, "op": "is_obstruction", "map": "full_scenario", "robot_radius": 0,
+#    "coords": [5, 2]}
+#   -> {"id": 2, "is_obstruction": true}
+#
+# The obstructions are inflated by the robot radius, which defaults to 0.
+#
+# If a request fails, the response is {"id": ..., "error": "..."}.
+#
+# Plan requests from all the clients go onto one queue. They are taken
+# off in batches: the first request waits for up to the batch window for
+# others to arrive. The batch is grouped by map, planner and robot radius,
+# identical queries are only planned once, and each group is planned as a
+# single job on the worker threads.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from common.scenarios import all_scenarios
+from grid_search.compiled_map import CompiledMap
+
+from .high_level_environment import PlannerType, create_planner
+
+_logger = logging.getLogger(__name__)
+
+class PlanningServer(object):
+
+    def __init__(self, socket_path, airport_maps, max_batch_size = 64, \
+                 batch_window_in_seconds = 0.005, max_workers = 4, result_cache_size = 4096):
+        self._socket_path = socket_path
+
+        # Dictionary of map name -> map
+        self._airport_maps = airport_maps
+
+        self._max_batch_size = max_batch_size
+        self._batch_window_in_seconds = batch_window_in_seconds
+        self._executor = ThreadPoolExecutor(max_workers = max_workers, \
+                                            thread_name_prefix = 'planning_server')
+
+        # Planners on the compiled maps, keyed on (map name, planner type, robot radius)
+        self._planners = {}
+
+        # The most recent results, keyed on (map name, planner type, robot radius, start, goal)
+        self._result_cache = OrderedDict()
+        self._result_cache_size = result_cache_size
+
+        self._request_queue = None
+        self._server = None
+
+        # The tasks which are running. The event loop only keeps weak
+        # references to tasks, so they are kept here until they finish.
+        self._tasks = set()
+
+    # Run the server until it is cancelled
+    async def serve_forever(self):
+        self._request_queue = asyncio.Queue()
+
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+        self._server = await asyncio.start_unix_server(self._handle_client, path = self._socket_path)
+        batcher = self._start_task(self._process_batches())
+
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            batcher.cancel()
+            for task in list(self._tasks):
+                task.cancel()
+            self._executor.shutdown(wait = False, cancel_futures = True)
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+
+    # Read the requests from a client and write back the responses. The
+    # requests are handled concurrently, so the responses can come back
+    # in a different order.
+    async def _handle_client(self, reader, writer):
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = self._start_task(self._handle_request(line, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending, return_exceptions = True)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            if request['op'] == 'plan':
+                response = await self._plan(request)
+            elif request['op'] == 'is_obstruction':
+                coords = request['coords']
+                airport_map = self._airport_maps[request['map']]
+                blocked = airport_map.inflated_obstruction_mask(request.get('robot_radius', 0))
+                response = {'is_obstruction': bool(blocked[coords[0], coords[1]])}
+            else:
+                raise ValueError(f'unknown op {request["op"]}')
+        except Exception as error:
+            response = {'error': f'{type(error).__name__}: {error}'}
+
+        response['id'] = request_id
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    # Queue a plan request, and wait for the batch it ends up in
+    async def _plan(self, request):
+        key = (request['map'], PlannerType[request['planner']], request.get('robot_radius', 0), \
+               tuple(request['start']), tuple(request['goal']))
+
+        if key[0] not in self._airport_maps:
+            raise KeyError(f'unknown map {key[0]}')
+
+        response = self._result_cache.get(key)
+        if response is not None:
+            self._result_cache.move_to_end(key)
+            return dict(response)
+
+        future = asyncio.get_running_loop().create_future()
+        await self._request_queue.put((key, future))
+        return dict(await future)
+
+    # Take requests off the queue in batches and plan them
+    async def _process_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._request_queue.get()]
+            deadline = loop.time() + self._batch_window_in_seconds
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._request_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Group identical queries, and then group the queries by planner
+            futures = {}
+            for key, future in batch:
+                futures.setdefault(key, []).append(future)
+            groups = {}
+            for key in futures:
+                groups.setdefault(key[:3], []).append(key[3:])
+
+            for group_key, queries in groups.items():
+                self._start_task(self._plan_group(group_key, queries, futures))
+
+    # Start a task, keeping it until it finishes, and log it if it fails
+    def _start_task(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if (task.cancelled() is False) and (task.exception() is not None):
+            _logger.error('A planning server task failed', exc_info = task.exception())
+
+    async def _plan_group(self, group_key, queries, futures):
+        try:
+            planner = self._planner(*group_key)
+            responses = await asyncio.get_running_loop().run_in_executor( \
+                self._executor, _plan_queries, planner, queries)
+        except Exception as error:
+            responses = [{'error': f'{type(error).__name__}: {error}'}] * len(queries)
+
+        for query, response in zip(queries, responses):
+            key = group_key + query
+            if 'error' not in response:
+                self._result_cache[key] = response
+                if len(self._result_cache) > self._result_cache_size:
+                    self._result_cache.popitem(last = False)
+            for future in futures[key]:
+                if future.done() is False:
+                    future.set_result(response)
+
+    # Get the planner for a map, building it the first time
+    def _planner(self, map_name, planner_type, robot_radius):
+        key = (map_name, planner_type, robot_radius)
+        planner = self._planners.get(key)
+        if planner is None:
+            compiled_map = CompiledMap(self._airport_maps[map_name], robot_radius)
+            planner = create_planner(planner_type, compiled_map)
+            planner.show_graphics(False)
+            self._planners[key] = planner
+        return planner
+
+# Plan a list of (start, goal) queries with the planner, and build the responses
+def _plan_queries(planner, queries):
+    responses = []
+    for start_coords, goal_coords in queries:
+        path = planner.plan_path(start_coords, goal_coords)
+        responses.append({'goal_reached': path.goal_reached, \
+                          'path_travel_cost': path.path_travel_cost, \
+                          'number_of_cells_visited': path.number_of_cells_visited, \
+                          'coordinates': [list(waypoint.coords()) for waypoint in path.waypoints]})
+    return responses
+
+if __name__ == '__main__':
+
+    scenarios = {scenario.__name__ : scenario for scenario in all_scenarios()}
+
+    parser = argparse.ArgumentParser(description = 'Run a planning server on a Unix socket.')
+    parser.add_argument('--socket', default = '/tmp/airport_planning_server.sock')
+    parser.add_argument('--maps', nargs = '+', default = list(scenarios.keys()), choices = list(scenarios.keys()))
+    parser.add_argument('--workers', type = int, default = os.cpu_count())
+    parser.add_argument('--max-batch-size', type = int, default = 64)
+    parser.add_argument('--batch-window', type = float, default = 0.005)
+    arguments = parser.parse_args()
+
+    airport_maps = {name : scenarios[name]()[0] for name in arguments.maps}
+
+    server = PlanningServer(arguments.socket, airport_maps, arguments.max_batch_size, \
+                            arguments.batch_window, arguments.workers)
+
+    print(f'Serving {", ".join(airport_maps.keys())} on {arguments.socket}')
+    asyncio.run(server.serve_forever())
@@ -10,6 +10,8 @@ import numpy as np
 from gymnasium import Env, spaces
 
 from common.airport_map import MapCellType
+from generalized_policy_iteration.compiled_transition_model import \
+    CompiledTransitionModel
 from generalized_policy_iteration.tabular_value_function import \
     TabularValueFunction
 
@@ -41,6 +43,10 @@ class LowLevelEnvironment(Env):
 
         # Set probability that the robot will go in the intended direction
         self.set_nominal_direction_probability(0.8)
+
+        # The compiled transition models, keyed on the map version and the
+        # nominal direction probability
+        self._compiled_transition_models = {}
         
     # Reset the environment state
     def reset(self):
@@ -66,6 +72,20 @@ class LowLevelEnvironment(Env):
     def map(self):
         return self._airport_map
             
+    # Get the transition model compiled into sparse arrays. It is compiled
+    # again if the map or the nominal direction probability change.
+    def compiled_transition_model(self):
+        version = self._airport_map.version()
+        key = (version, self._p)
+        model = self._compiled_transition_models.get(key)
+        if model is None:
+            # Models for older versions of the map are never used again
+            self._compiled_transition_models = {k : m for k, m in \
+                                                self._compiled_transition_models.items() if k[0] == version}
+            model = CompiledTransitionModel(self)
+            self._compiled_transition_models[key] = model
+        return model
+
     # Critical the initial value function
     def initial_value_function(self):
         # Assign
@@ -7,7 +7,7 @@ the convergence speed (time and iteration count). We run two experiments:
 1. Holding theta constant and varying max policy evaluation steps.
 2. Holding max policy evaluation steps constant and varying theta.
 
-We count outer policy iterations via monkey-patching without modifying the original class.
+We count outer policy iterations with a hook on the policy iterator.
 @author: ucacsjj
 '''
 
@@ -19,6 +19,10 @@ from generalized_policy_iteration.value_function_drawer import ValueFunctionDraw
 from p2.low_level_environment import LowLevelEnvironment
 from p2.low_level_policy_drawer import LowLevelPolicyDrawer
 
+# Hook which counts the number of times it is called
+def count_iteration(solver):
+    solver.iteration_counter += 1
+
 if __name__ == '__main__':
     
     # Set up the map and environment.
@@ -40,17 +44,10 @@ if __name__ == '__main__':
         policy_solver.set_max_policy_evaluation_steps_per_iteration(eval_steps)
         policy_solver.set_theta(const_theta)
         
-        # Monkey-patch _improve_policy to count outer iterations.
-        # Get the unbound original method from the class.
-        original_improve_policy = PolicyIterator._improve_policy  
+        # Count outer iterations with a hook, which is called each time
+        # the policy is improved.
         policy_solver.iteration_counter = 0
-        
-        def patched_improve_policy(self):
-            self.iteration_counter += 1
-            return original_improve_policy(self)
-        
-        # Bind the patched method to our instance.
-        policy_solver._improve_policy = patched_improve_policy.__get__(policy_solver, PolicyIterator)
+        policy_solver.add_hook('on_policy_update', count_iteration)
         
         policy_solver.initialize()
         
@@ -85,15 +82,10 @@ if __name__ == '__main__':
         policy_solver.set_max_policy_evaluation_steps_per_iteration(const_eval_steps)
         policy_solver.set_theta(theta)
         
-        # Monkey-patch _improve_policy to count outer iterations.
-        original_improve_policy = PolicyIterator._improve_policy  
+        # Count outer iterations with a hook, which is called each time
+        # the policy is improved.
         policy_solver.iteration_counter = 0
-        
-        def patched_improve_policy(self):
-            self.iteration_counter += 1
-            return original_improve_policy(self)
-        
-        policy_solver._improve_policy = patched_improve_policy.__get__(policy_solver, PolicyIterator)
+        policy_solver.add_hook('on_policy_update', count_iteration)
         
         policy_solver.initialize()
         
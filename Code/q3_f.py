@@ -22,7 +22,10 @@ if __name__ == '__main__':
     # Set up the environment for the robot driving around
     airport_environment = LowLevelEnvironment(airport_map)
     
-    # Configure the process model
+    # Configure the process model. With p = 1 the transitions are
+    # deterministic, so the value iterator finds the solution with a
+    # shortest path search rather than by sweeping. Call
+    # set_use_deterministic_fast_path(False) to see it sweep.
     airport_environment.set_nominal_direction_probability(1.0)
     
     # Create the policy iterator
@@ -13,6 +13,10 @@ from generalized_policy_iteration.value_function_drawer import ValueFunctionDraw
 from p2.low_level_environment import LowLevelEnvironment
 from p2.low_level_policy_drawer import LowLevelPolicyDrawer
 
+# Hook which counts the number of times it is called
+def count_iteration(solver):
+    solver.iteration_counter += 1
+
 if __name__ == '__main__':
     
     # Get the map for the scenario
@@ -29,14 +33,14 @@ if __name__ == '__main__':
     # Create the policy iterator
     policy_solver = PolicyIterator(airport_environment)
     
-    # --- Monkey-patch PolicyIterator to count iterations ---
+    # Count the iterations with a hook, which is called each time the
+    # policy is improved
     policy_solver.iteration_counter = 0
-    original_improve_policy = PolicyIterator._improve_policy
-    def patched_improve_policy(self):
-        self.iteration_counter += 1
-        return original_improve_policy(self)
-    policy_solver._improve_policy = patched_improve_policy.__get__(policy_solver, PolicyIterator)
-    # ---------------------------------------------------------
+    policy_solver.add_hook('on_policy_update', count_iteration)
+
+    # With p = 1 the solvers would find the solution with a shortest path
+    # search, so turn this off to compare the number of iterations
+    policy_solver.set_use_deterministic_fast_path(False)
     
     # Set up initial state
     policy_solver.initialize()
@@ -69,34 +73,11 @@ if __name__ == '__main__':
     # Create the value iterator instance
     value_solver = ValueIterator(airport_environment)
     
-    # Monkey-patch ValueIterator to count iterations
+    # Count the iterations with a hook, which is called after each sweep
+    # over the states
     value_solver.iteration_counter = 0
-    original_compute_optimal = ValueIterator._compute_optimal_value_function
-    def patched_compute_optimal(self):
-        environment = self._environment
-        map_ = environment.map()
-        for _ in range(self._max_optimal_value_function_iterations):
-            self.iteration_counter += 1
-            delta = 0
-            for x in range(map_.width()):
-                for y in range(map_.height()):
-                    if map_.cell(x, y).is_obstruction() or map_.cell(x, y).is_terminal():
-                        continue
-                    old_v = self._v.value(x, y)
-                    best_q = float('-inf')
-                    for action in range(environment.available_actions().n):
-                        s_prime, r, p = environment.next_state_and_reward_distribution((x, y), action)
-                        q_value = 0
-                        for t in range(len(p)):
-                            s_prime_coords = s_prime[t].coords()
-                            q_value += p[t] * (r[t] + self._gamma * self._v.value(s_prime_coords[0], s_prime_coords[1]))
-                        if q_value > best_q:
-                            best_q = q_value
-                    self._v.set_value(x, y, best_q)
-                    delta = max(delta, abs(old_v - best_q))
-            if delta < self._theta:
-                break
-    value_solver._compute_optimal_value_function = patched_compute_optimal.__get__(value_solver, ValueIterator)
+    value_solver.add_hook('on_sweep', lambda solver, delta : count_iteration(solver))
+    value_solver.set_use_deterministic_fast_path(False)
     
     # Set up initial state for value iteration
     value_solver.initialize()